@@ -12,5 +12,11 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'a_core.settings')
+# CORS is handled by EdgeASGIMiddleware, so settings drop corsheaders
+os.environ.setdefault('DJANGO_ASGI_EDGE', '1')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from a_core.middleware import EdgeASGIMiddleware  # noqa: E402
+
+application = EdgeASGIMiddleware(django_application)
@@ -0,0 +1,169 @@
+import time
+
+from django.conf import settings
+from django.core.handlers.base import BaseHandler
+from django.core.handlers.exception import convert_exception_to_response
+
+from utils.today import reset_today, set_today
+
+
+# Same defaults as django-cors-headers
+_CORS_ALLOW_HEADERS = (
+    'accept', 'authorization', 'content-type', 'user-agent',
+    'x-csrftoken', 'x-requested-with',
+)
+_CORS_ALLOW_METHODS = ('DELETE', 'GET', 'OPTIONS', 'PATCH', 'POST', 'PUT')
+_CORS_PREFLIGHT_MAX_AGE = 86400
+
+# Paths that need no session, CSRF, auth user or messages
+_EXCLUDED_PATHS = frozenset((
+    '/api/schema/',
+    '/api/docs/',
+    '/media/',
+    '/static/',
+    '/silk/',
+))
+_EXCLUDED_PREFIXES = tuple(_EXCLUDED_PATHS)
+
+
+class EdgeASGIMiddleware:
+    """Pure ASGI middleware wrapped around Django in asgi.py.
+
+    Handles CORS (replacing corsheaders' Django middleware when running
+    under ASGI) and adds an X-Response-Time header, without building any
+    request/response objects.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.allow_all_origins = getattr(settings, 'CORS_ALLOW_ALL_ORIGINS', False)
+        self.allow_credentials = getattr(settings, 'CORS_ALLOW_CREDENTIALS', False)
+        self.allowed_origins = frozenset(
+            origin.encode() for origin in getattr(settings, 'CORS_ALLOWED_ORIGINS', ())
+        )
+        self.preflight_headers = [
+            (b'access-control-allow-headers', ', '.join(_CORS_ALLOW_HEADERS).encode()),
+            (b'access-control-allow-methods', ', '.join(_CORS_ALLOW_METHODS).encode()),
+            (b'access-control-max-age', str(_CORS_PREFLIGHT_MAX_AGE).encode()),
+        ]
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        origin = None
+        is_preflight = False
+        for name, value in scope['headers']:
+            if name == b'origin':
+                origin = value
+            elif name == b'access-control-request-method':
+                is_preflight = True
+
+        cors_headers = self._cors_headers(origin) if origin else []
+
+        if is_preflight and scope['method'] == 'OPTIONS' and cors_headers:
+            await send({
+                'type': 'http.response.start',
+                'status': 200,
+                'headers': cors_headers + self.preflight_headers + [
+                    (b'content-length', b'0'),
+                ],
+            })
+            await send({'type': 'http.response.body', 'body': b''})
+            return
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                headers = list(message.get('headers', []))
+                headers.extend(cors_headers)
+                headers.append((b'x-response-time', f'{elapsed_ms:.2f}ms'.encode()))
+                message['headers'] = headers
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+    def _cors_headers(self, origin):
+        if not (self.allow_all_origins or origin in self.allowed_origins):
+            return []
+        if self.allow_all_origins and not self.allow_credentials:
+            return [(b'access-control-allow-origin', b'*')]
+
+        headers = [
+            (b'access-control-allow-origin', origin),
+            (b'vary', b'origin'),
+        ]
+        if self.allow_credentials:
+            headers.append((b'access-control-allow-credentials', b'true'))
+        return headers
+
+
+class _BareHandler(BaseHandler):
+    """Handler that resolves and calls the view with no middleware at all."""
+
+    def load_middleware(self, is_async=False):
+        self._view_middleware = []
+        self._template_response_middleware = []
+        self._exception_middleware = []
+        self._middleware_chain = convert_exception_to_response(self._get_response)
+
+
+class PathExclusionMiddleware:
+    """Send docs/schema/media requests straight to the view.
+
+    Placed near the top of MIDDLEWARE; for excluded paths the remaining
+    middleware (sessions, CSRF, auth, messages, ...) is skipped entirely.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.bare_handler = _BareHandler()
+        self.bare_handler.load_middleware()
+
+    def __call__(self, request):
+        if request.path.startswith(_EXCLUDED_PREFIXES):
+            return self.bare_handler._middleware_chain(request)
+        return self.get_response(request)
+
+
+class PermissionCacheMiddleware:
+    """Load a session user's permissions once, right after authentication.
+
+    ModelBackend keeps them in _perm_cache/_user_perm_cache/_group_perm_cache
+    on the user object, so every later has_perm() in the request (admin
+    pages check dozens) is a set lookup. API requests authenticate with JWT
+    inside DRF and see an anonymous user here, so they pay nothing.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        # Without a session cookie there is no session user; don't force the
+        # lazy request.user (a session and user query) just to find that out
+        if (request.session.session_key
+                and not request.path.startswith(_EXCLUDED_PREFIXES)):
+            user = request.user
+            if user.is_authenticated and user.is_active and not user.is_superuser:
+                user.get_all_permissions()
+        return self.get_response(request)
+
+
+class RequestDateMiddleware:
+    """Pin utils.today.today() for the request.
+
+    Model properties (is_overdue, days_until_due, ...) read it per row, so
+    a list of invoices looks the date up once instead of once per field.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = set_today()
+        try:
+            return self.get_response(request)
+        finally:
+            reset_today(token)
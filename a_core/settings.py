@@ -13,7 +13,7 @@ SECRET_KEY = os.getenv('SECRET_KEY') or get_random_secret_key()
 
 DEBUG = os.getenv('DEBUG', 'True').lower() in ('true', '1', 't')
 
-ALLOWED_HOSTS = ['*', 'localhost', '127.0.0.1']
+ALLOWED_HOSTS = ['*']
 
 AUTH_USER_MODEL = "a_users.CustomUser"
 
@@ -34,14 +34,12 @@ INSTALLED_APPS = [
     'rest_framework_simplejwt',
     'rest_framework_simplejwt.token_blacklist',
     'corsheaders',
-    'jazzmin',
-    'drf_spectacular',
+    'cachalot',
 
     # My apps
     'a_users',
     'tenant',
     'property',
-    'silk',
     'finance',
     'management',
     'maintenance',
@@ -51,19 +49,43 @@ SITE_ID = 1
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Serve static files before the rest of the chain runs
+    'whitenoise.middleware.WhiteNoiseMiddleware',
+    # Docs, schema and media requests skip everything below
+    'a_core.middleware.PathExclusionMiddleware',
+    'a_core.middleware.RequestDateMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'a_core.middleware.PermissionCacheMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'allauth.account.middleware.AccountMiddleware',
     'django_htmx.middleware.HtmxMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
-    'silk.middleware.SilkyMiddleware',
 ]
 
+# Under ASGI (a_core/asgi.py) CORS is answered by EdgeASGIMiddleware
+# outside Django, so skip the per-request corsheaders wrapper there.
+if os.getenv('DJANGO_ASGI_EDGE') == '1':
+    MIDDLEWARE.remove('corsheaders.middleware.CorsMiddleware')
+
+# Silk records every request and its SQL; only profile in development
+if DEBUG:
+    INSTALLED_APPS += ['silk']
+    MIDDLEWARE += ['silk.middleware.SilkyMiddleware']
+
+# Admin theme and OpenAPI docs are dev tooling; opt in elsewhere via env
+ENABLE_ADMIN_THEME = DEBUG or os.getenv('ENABLE_ADMIN_THEME') == '1'
+ENABLE_API_DOCS = DEBUG or os.getenv('ENABLE_API_DOCS') == '1'
+
+if ENABLE_ADMIN_THEME:
+    # jazzmin overrides admin templates, so it must come before admin
+    INSTALLED_APPS.insert(0, 'jazzmin')
+if ENABLE_API_DOCS:
+    INSTALLED_APPS += ['drf_spectacular']
+
 ROOT_URLCONF = "a_core.urls"
 
 TEMPLATES = [
@@ -84,17 +106,67 @@ TEMPLATES = [
 
 WSGI_APPLICATION = "a_core.wsgi.application"
 
-# ✅ SQLite Database
+# ✅ PostgreSQL Database (same env vars as docker-compose's db service)
+# Persistent connections avoid a reconnect per request; put pgbouncer in
+# transaction mode in front of it when running many workers.
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.getenv('POSTGRES_DB', 'property_hub'),
+        'USER': os.getenv('POSTGRES_USER', 'postgres'),
+        'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
+        'HOST': os.getenv('POSTGRES_HOST', 'localhost'),
+        'PORT': os.getenv('POSTGRES_PORT', '5432'),
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '600')),
+        'CONN_HEALTH_CHECKS': True,
+        'ATOMIC_REQUESTS': False,
     }
 }
 
+# Shared Redis cache when REDIS_URL is set, per-process memory otherwise
+REDIS_URL = os.getenv('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': REDIS_URL,
+            'OPTIONS': {
+                'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+            },
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# ORM query cache for the read-mostly finance lookups (charge types,
+# billing periods, ...). Invalidation must reach every worker, so only
+# enable it on a shared cache.
+CACHALOT_ENABLED = bool(REDIS_URL)
+CACHALOT_ONLY_CACHABLE_APPS = frozenset(['finance'])
+CACHALOT_UNCACHABLE_TABLES = frozenset([
+    'django_migrations',
+    # Write-heavy; caching them would mostly churn
+    'finance_transaction',
+    'finance_invoiceitem',
+])
+
+# Celery; without a broker, views that can offload work run it inline.
+# Opt in explicitly (not via REDIS_URL): tasks only run if a worker
+# is consuming this broker, e.g. the worker service in docker-compose.yml.
+CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL')
+CELERY_TASK_ALWAYS_EAGER = not CELERY_BROKER_URL
+# Needed for polling task state (e.g. receipt PDF downloads)
+CELERY_RESULT_BACKEND = os.getenv('CELERY_RESULT_BACKEND') or REDIS_URL
+CELERY_TASK_SERIALIZER = 'json'
+CELERY_ACCEPT_CONTENT = ['json']
+
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "a_users.auth.CachedJWTAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": (
         "rest_framework.permissions.IsAuthenticatedOrReadOnly",
@@ -102,8 +174,13 @@ REST_FRAMEWORK = {
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
     ],
-    'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    'DEFAULT_RENDERER_CLASSES': [
+        'utils.renderers.OrjsonRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
 }
+if ENABLE_API_DOCS:
+    REST_FRAMEWORK['DEFAULT_SCHEMA_CLASS'] = 'drf_spectacular.openapi.AutoSchema'
 
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=120),
@@ -117,6 +194,9 @@ SIMPLE_JWT = {
     'AUTH_HEADER_TYPES': ('Bearer',),
 }
 
+# Seconds a verified access token is reused by a_users.auth.CachedJWTAuthentication
+JWT_AUTH_CACHE_TTL = int(os.getenv('JWT_AUTH_CACHE_TTL', '5'))
+
 AUTHENTICATION_BACKENDS = [
     "django.contrib.auth.backends.ModelBackend",
     "allauth.account.auth_backends.AuthenticationBackend",
@@ -125,6 +205,32 @@ AUTHENTICATION_BACKENDS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Files only ever served through an authenticated view (receipt PDFs).
+# Outside MEDIA_ROOT and without a base_url, so nothing maps to a URL.
+PRIVATE_MEDIA_ROOT = os.getenv(
+    'PRIVATE_MEDIA_ROOT', os.path.join(BASE_DIR, 'private_media'))
+
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+    'private': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+        'OPTIONS': {'location': PRIVATE_MEDIA_ROOT, 'base_url': None},
+    },
+}
+
+# Argon2id for new hashes; existing PBKDF2 hashes still verify and are
+# upgraded on the next successful login.
+PASSWORD_HASHERS = [
+    'a_users.hashers.TunedArgon2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+]
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         "NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",
@@ -142,8 +248,10 @@ AUTH_PASSWORD_VALIDATORS = [
 
 CURRENCY = os.getenv("CURRENCY")
 
+# Auth is a bearer token header, not cookies, so no credentialed CORS;
+# this lets the response carry a fixed 'Access-Control-Allow-Origin: *'.
 CORS_ALLOW_ALL_ORIGINS = True
-CORS_ALLOW_CREDENTIALS = True
+CORS_ALLOW_CREDENTIALS = False
 
 LANGUAGE_CODE = 'en-us'
 TIME_ZONE = "UTC"
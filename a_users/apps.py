@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class AUsersConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'a_users'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,67 @@
+import copy
+import hashlib
+import threading
+import time
+
+from cachetools import TTLCache
+from django.conf import settings
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+
+# sha256(raw token) -> (user, validated_token). Only successful validations
+# are stored, and entries never outlive the token itself. The stored user is
+# never handed out; each request gets its own copy.
+_TOKEN_CACHE = TTLCache(
+    maxsize=10000, ttl=getattr(settings, 'JWT_AUTH_CACHE_TTL', 5))
+_TOKEN_CACHE_LOCK = threading.Lock()
+
+
+def forget_user_tokens(user_id):
+    """Drop cached authentications for a user, e.g. after deactivation."""
+    with _TOKEN_CACHE_LOCK:
+        stale = [key for key, (user, _token) in _TOKEN_CACHE.items()
+                 if user.pk == user_id]
+        for key in stale:
+            _TOKEN_CACHE.pop(key, None)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication that memoizes verified tokens for a few seconds.
+
+    Clients usually fire bursts of requests with the same access token, so
+    skipping the signature check and user lookup on repeats saves work.
+    """
+
+    def authenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        key = hashlib.sha256(raw_token).digest()
+        with _TOKEN_CACHE_LOCK:
+            cached = _TOKEN_CACHE.get(key)
+        if cached is not None:
+            return self._for_request(cached)
+
+        # Failed validations raise here and are never cached
+        result = super().authenticate(request)
+        if result is None:
+            return None
+
+        _user, validated_token = result
+        if validated_token.get('exp', 0) - time.time() > _TOKEN_CACHE.ttl:
+            with _TOKEN_CACHE_LOCK:
+                _TOKEN_CACHE[key] = result
+            return self._for_request(result)
+        return result
+
+    @staticmethod
+    def _for_request(result):
+        """Copy the cached user so per-request state (_perm_cache, ...)
+        set on it can't leak into concurrent requests."""
+        user, validated_token = result
+        return copy.copy(user), validated_token
@@ -0,0 +1,8 @@
+from django.contrib.auth.hashers import Argon2PasswordHasher
+
+
+class TunedArgon2PasswordHasher(Argon2PasswordHasher):
+    """Argon2id at OWASP's baseline (19 MiB, 2 passes, 1 lane), ~50ms per login."""
+    time_cost = 2
+    memory_cost = 19456
+    parallelism = 1
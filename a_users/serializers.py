@@ -1,16 +1,45 @@
-from django.contrib.auth import authenticate
-import traceback
-from venv import logger
-from django.contrib.auth import get_user_model
+import logging
+from operator import attrgetter
 from django.contrib.auth.password_validation import validate_password
+from django.core.cache import cache
 from django.core.exceptions import ValidationError as DjangoValidationError
-from django.db import transaction
+from django.db import IntegrityError, transaction
+from django.db.models import Q
 from rest_framework import serializers
-from tenant.models import Tenant
-from .models import CustomUser
+from rest_framework.exceptions import PermissionDenied
+from .models import _TENANT_CREATOR_ROLES, CustomUser, full_name
 
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 
+logger = logging.getLogger(__name__)
+
+
+def get_identity_clashes(email=None, username=None, phone_number=None):
+    """Return {field: message} for identifiers already taken, in one query."""
+    # save() stores emails lowercased, so an exact match can use the unique index
+    email = email.lower() if email else email
+    lookup = Q()
+    if email:
+        lookup |= Q(email=email)
+    if username:
+        lookup |= Q(username=username)
+    if phone_number:
+        lookup |= Q(phone_number=phone_number)
+    if not lookup:
+        return {}
+
+    errors = {}
+    existing = CustomUser.objects.filter(lookup).values_list(
+        'email', 'username', 'phone_number')
+    for taken_email, taken_username, taken_phone in existing:
+        if email and taken_email == email:
+            errors['email'] = "This email is already in use."
+        if username and taken_username == username:
+            errors['username'] = "This username is already in use."
+        if phone_number and taken_phone == phone_number:
+            errors['phone_number'] = "This phone number is already in use."
+    return errors
+
 
 class UserListSerializer(serializers.ModelSerializer):
     """Simple serializer for admin to view all users."""
@@ -29,15 +58,66 @@ class UserListSerializer(serializers.ModelSerializer):
 
     def get_created_by_name(self, obj):
         """Get the name of the user who created this account."""
-        if obj.created_by:
-            return obj.created_by.get_full_name()
+        # created_by is joined by the view queryset (select_related)
+        created_by = obj.created_by if obj.created_by_id else None
+        if created_by:
+            return created_by.get_full_name()
         return None
 
     def get_tenant_count(self, obj):
         """Get count of tenants created by this user (for admins/property managers)."""
-        if obj.can_create_tenants():
-            return obj.get_created_tenants().count()
-        return None
+        if not obj.can_create_tenants():
+            return None
+        # Prefer the count annotated by the view to avoid a query per row
+        tenant_count = getattr(obj, 'tenant_count_ann', None)
+        if tenant_count is None:
+            tenant_count = obj.get_created_tenants().count()
+        return tenant_count
+
+
+# Columns read by user_list_rows(); mirrors UserListSerializer.Meta.fields
+USER_LIST_VALUES = (
+    'id', 'username', 'email', 'first_name', 'last_name', 'role',
+    'phone_number', 'is_active', 'user_status', 'email_verified',
+    'date_joined', 'created_by_id', 'created_by__first_name',
+    'created_by__last_name', 'created_by__username', 'tenant_count_ann',
+)
+
+
+def user_list_rows(values):
+    """Build UserListSerializer-shaped dicts from .values(*USER_LIST_VALUES) rows.
+
+    The queryset must carry the tenant_count_ann annotation.
+    """
+    rows = []
+    for row in values:
+        created_by_name = None
+        if row['created_by_id']:
+            created_by_name = full_name(
+                row['created_by__first_name'], row['created_by__last_name'],
+                row['created_by__username'])
+        tenant_count = None
+        # CustomUser.can_create_tenants() on the row's columns
+        if row['role'] in _TENANT_CREATOR_ROLES and row['is_active']:
+            tenant_count = row['tenant_count_ann']
+        rows.append({
+            'id': row['id'],
+            'username': row['username'],
+            'email': row['email'],
+            'first_name': row['first_name'],
+            'last_name': row['last_name'],
+            'full_name': full_name(
+                row['first_name'], row['last_name'], row['username']),
+            'role': row['role'],
+            'phone_number': row['phone_number'],
+            'is_active': row['is_active'],
+            'user_status': row['user_status'],
+            'email_verified': row['email_verified'],
+            'date_joined': row['date_joined'],
+            'created_by_name': created_by_name,
+            'tenant_count': tenant_count,
+        })
+    return rows
 
 # some changes to the server
 
@@ -61,34 +141,88 @@ class CustomUserSerializer(serializers.ModelSerializer):
 
     def get_created_by_info(self, obj):
         """Get information about who created this user."""
-        if obj.created_by:
-            return {
-                'id': obj.created_by.id,
-                'name': obj.created_by.get_full_name(),
-                'role': obj.created_by.role,
-                'email': obj.created_by.email
-            }
-        return None
+        return created_by_info(obj)
 
     def get_tenant_info(self, obj):
         """Get tenant-specific information if user is a tenant."""
-        if obj.role != 'tenant':
-            return None
+        return tenant_info(obj)
 
-        try:
-            tenant = obj.tenant_profile
-            return {
-                'id': tenant.id,
-                'status': tenant.status,
-                'lease_start_date': tenant.lease_start_date,
-                'lease_end_date': tenant.lease_end_date,
-                'monthly_rent': tenant.monthly_rent,
-                'is_lease_active': tenant.is_lease_active,
-                'days_until_lease_expires': tenant.days_until_lease_expires,
-            }
-
-        except Tenant.DoesNotExist:
-            return None
+
+def created_by_info(user):
+    if not user.created_by_id:
+        return None
+    creator = user.created_by
+    return {
+        'id': creator.id,
+        'name': creator.get_full_name(),
+        'role': creator.role,
+        'email': creator.email
+    }
+
+
+def tenant_info(user):
+    if user.role != 'tenant':
+        return None
+
+    tenant = getattr(user, 'tenant_profile', None)
+    if tenant is None:
+        return None
+    return {
+        'id': tenant.id,
+        'status': tenant.status,
+        'lease_start_date': tenant.lease_start_date,
+        'lease_end_date': tenant.lease_end_date,
+        'monthly_rent': tenant.monthly_rent,
+        'is_lease_active': tenant.is_lease_active,
+        'days_until_lease_expires': tenant.days_until_lease_expires,
+    }
+
+
+def _profile_url(user):
+    return user.profile.url if user.profile else None
+
+
+# (name, getter) per CustomUserSerializer field, in output order, resolved
+# once at import
+_USER_OUT_GETTERS = tuple(
+    (name, {
+        'full_name': CustomUser.get_full_name,
+        'profile': _profile_url,
+        'created_by_info': created_by_info,
+        'tenant_info': tenant_info,
+    }.get(name) or attrgetter(name))
+    for name in CustomUserSerializer.Meta.fields
+)
+
+
+def user_to_dict(user):
+    """Same output as CustomUserSerializer(user).data, without DRF's field machinery."""
+    return {name: getter(user) for name, getter in _USER_OUT_GETTERS}
+
+
+USER_DATA_CACHE_TTL = 300
+
+
+def user_data_cache_key(user):
+    """Versioned by updated_at, so any write that bumps it misses on every worker."""
+    return f'user_ser:{user.id}:{int(user.updated_at.timestamp() * 1_000_000)}'
+
+
+def get_cached_user_data(user):
+    """user_to_dict(user), cached until the user or tenant profile changes."""
+    key = user_data_cache_key(user)
+    data = cache.get(key)
+    if data is None:
+        data = user_to_dict(user)
+        cache.set(key, data, USER_DATA_CACHE_TTL)
+    return data
+
+
+# Roles each creator role may assign in create_user (admins may assign any)
+ROLE_CREATION_MATRIX = {
+    'admin': frozenset(('admin',)),
+    'property_manager': frozenset(('tenant', 'caretaker', 'agent')),
+}
 
 
 class CustomUserCreateSerializer(serializers.ModelSerializer):
@@ -104,23 +238,50 @@ class CustomUserCreateSerializer(serializers.ModelSerializer):
             'role', 'phone_number', 'gender', 'identity_number',
             'emergency_contact_number'
         ]
+        # Uniqueness is checked in validate() with a single query
+        extra_kwargs = {
+            'email': {'validators': []},
+            'username': {'validators': []},
+            'phone_number': {
+                'validators': CustomUser._meta.get_field('phone_number').validators
+            },
+        }
 
     def validate_email(self, value):
-        if CustomUser.objects.filter(email__iexact=value).exists():
-            raise serializers.ValidationError("This email is already in use.")
         return value.lower()
 
-    def validate_phone_number(self, value):
-        if value and CustomUser.objects.filter(phone_number=value).exists():
-            raise serializers.ValidationError(
-                "This phone number is already in use.")
+    def validate_role(self, value):
+        creator = self.context['request'].user
+        if creator.role == 'admin':
+            return value
+        allowed_roles = ROLE_CREATION_MATRIX.get(creator.role, frozenset())
+        if value not in allowed_roles:
+            # Same 403 body create_user has always returned
+            raise PermissionDenied({
+                'error': f"You can only create users with roles: {', '.join(sorted(allowed_roles))}"
+            })
         return value
 
+    def validate(self, data):
+        errors = get_identity_clashes(
+            email=data.get('email'),
+            username=data.get('username'),
+            phone_number=data.get('phone_number'),
+        )
+        if errors:
+            raise serializers.ValidationError(errors)
+        return data
+
     def create(self, validated_data):
         password = validated_data.pop('password')
         user = CustomUser(**validated_data)
         user.set_password(password)
-        user.save()
+        try:
+            with transaction.atomic():
+                user.save()
+        except IntegrityError:
+            raise serializers.ValidationError(
+                "A user with these details already exists.")
         return user
 
 
@@ -139,6 +300,8 @@ class ProfileUpdateSerializer(serializers.ModelSerializer):
             return value
 
         user = self.context['request'].user
+        if value == user.phone_number:
+            return value
         if CustomUser.objects.exclude(id=user.id).filter(phone_number=value).exists():
             raise serializers.ValidationError(
                 "This phone number is already in use.")
@@ -155,11 +318,20 @@ class ProfileUpdateSerializer(serializers.ModelSerializer):
             return value
 
         user = self.context['request'].user
+        if value == user.identity_number:
+            return value
         if CustomUser.objects.exclude(id=user.id).filter(identity_number=value).exists():
             raise serializers.ValidationError(
                 "This identity number is already in use.")
         return value
 
+    def update(self, instance, validated_data):
+        """Write only the submitted profile columns."""
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        instance.save(update_fields=list(validated_data) + ['updated_at'])
+        return instance
+
 
 class ChangePasswordSerializer(serializers.Serializer):
     """Serializer for password change."""
@@ -192,7 +364,10 @@ class ChangePasswordSerializer(serializers.Serializer):
         """Update user password and track the change."""
         user = self.context['request'].user
         user.set_password(self.validated_data['new_password'])
-        user.save()
+        user.save(update_fields=[
+            'password', 'password_changed_at', 'password_change_required',
+            'updated_at',
+        ])
         return user
 
 
@@ -202,69 +377,44 @@ class LoginSerializer(serializers.Serializer):
     password = serializers.CharField(required=True, write_only=True)
 
     def validate(self, data):
-        try:
-            logger.info(
-                f"Validating login data: {data.get('identifier', 'NO_IDENTIFIER')}")
-
-            identifier = data.get('identifier')
-            password = data.get('password')
-
-            if not identifier or not password:
-                logger.warning("Missing identifier or password")
-                raise serializers.ValidationError(
-                    "Identifier and password are required.")
-
-            # Use Django's authenticate function
-            user = authenticate(
-                request=self.context.get('request'),
-                username=identifier,  # For compatibility, pass identifier as username
-                password=password
-            )
+        identifier = data.get('identifier')
+        password = data.get('password')
 
-            if not user:
-                # Try to find user by email or phone if authenticate fails
-                UserModel = get_user_model()
-                try:
-                    if '@' in identifier:
-                        logger.info("Identifier appears to be email")
-                        user = UserModel.objects.get(email=identifier.lower())
-                    elif identifier.isdigit():
-                        logger.info("Identifier appears to be phone")
-                        user = UserModel.objects.get(phone_number=identifier)
-                    else:
-                        logger.info("Identifier appears to be username")
-                        user = UserModel.objects.get(username=identifier)
-                except UserModel.DoesNotExist:
-                    logger.info(
-                        f"User not found with identifier: {identifier}")
-                    raise serializers.ValidationError("Invalid credentials.")
-
-                # Re-authenticate with found user
-                if user and not user.check_password(password):
-                    logger.warning("Invalid password for user")
-                    raise serializers.ValidationError("Invalid credentials.")
-
-            logger.info(f"User found: {user.email}")
-
-            if not user.is_active:
-                logger.warning(f"User {user.email} is not active")
-                raise serializers.ValidationError("User account is disabled.")
-
-            # Check user_status if it exists
-            if hasattr(user, 'user_status') and hasattr(CustomUser, 'UserStatus'):
-                if user.user_status == CustomUser.UserStatus.SUSPENDED.value:
-                    logger.warning(f"User {user.email} is suspended")
-                    raise serializers.ValidationError(
-                        "User account is suspended.")
-
-            data['user'] = user
-            logger.info("Validation successful")
-            return data
-
-        except Exception as e:
-            logger.error(f"Validation error: {e}")
-            logger.error(f"Validation traceback: {traceback.format_exc()}")
-            raise serializers.ValidationError(f"Validation error: {str(e)}")
+        if not identifier or not password:
+            logger.warning("Missing identifier or password")
+            raise serializers.ValidationError(
+                "Identifier and password are required.")
+
+        # Match on the one column the identifier's shape points to, so the
+        # lookup hits that column's unique index and can't pick another
+        # user whose username happens to equal this email or phone
+        if '@' in identifier:
+            lookup = {'email': identifier.lower()}
+        elif identifier.lstrip('+').isdigit():
+            lookup = {'phone_number': identifier}
+        else:
+            lookup = {'username': identifier}
+        user = CustomUser.objects.filter(**lookup).first()
+
+        if user is None:
+            # Hash anyway, as ModelBackend does, so an unknown identifier
+            # takes as long as a wrong password and can't be told apart
+            CustomUser().set_password(password)
+        if user is None or not user.check_password(password):
+            logger.info("Invalid credentials for identifier: %s", identifier)
+            raise serializers.ValidationError("Invalid credentials.")
+
+        if not user.is_active:
+            logger.warning("User %s is not active", user.email)
+            raise serializers.ValidationError("User account is disabled.")
+
+        if user.user_status == CustomUser.UserStatus.SUSPENDED.value:
+            logger.warning("User %s is suspended", user.email)
+            raise serializers.ValidationError(
+                "User account is suspended.")
+
+        data['user'] = user
+        return data
 
 
 class RegisterSerializer(serializers.ModelSerializer):
@@ -287,7 +437,13 @@ class RegisterSerializer(serializers.ModelSerializer):
         extra_kwargs = {
             'first_name': {'required': True},
             'last_name': {'required': True},
-            'phone_number': {'required': True},
+            'phone_number': {
+                'required': True,
+                'validators': CustomUser._meta.get_field('phone_number').validators
+            },
+            # Uniqueness is checked in validate() with a single query
+            'email': {'validators': []},
+            'username': {'validators': []},
         }
 
     def validate(self, data):
@@ -310,24 +466,23 @@ class RegisterSerializer(serializers.ModelSerializer):
                 {"role": f"Role must be one of {', '.join(allowed_roles)}"}
             )
 
-        # Validate email uniqueness
-        if CustomUser.objects.filter(email=data['email'].lower()).exists():
-            raise serializers.ValidationError(
-                {"email": "This email is already in use."})
-
-        # Validate username uniqueness
-        if CustomUser.objects.filter(username=data['username']).exists():
-            raise serializers.ValidationError(
-                {"username": "This username is already in use."})
-
-        # Validate phone number uniqueness
-        if data.get('phone_number') and CustomUser.objects.filter(phone_number=data['phone_number']).exists():
-            raise serializers.ValidationError(
-                {"phone_number": "This phone number is already in use."})
+        # Validate email, username and phone number uniqueness in one query
+        errors = get_identity_clashes(
+            email=data['email'],
+            username=data['username'],
+            phone_number=data.get('phone_number'),
+        )
+        if errors:
+            raise serializers.ValidationError(errors)
 
         return data
 
     def create(self, validated_data):
         """Create a new user with validated data."""
         validated_data.pop('password2')
-        return CustomUser.objects.create_user(**validated_data)
+        try:
+            with transaction.atomic():
+                return CustomUser.objects.create_user(**validated_data)
+        except IntegrityError:
+            raise serializers.ValidationError(
+                "A user with these details already exists.")
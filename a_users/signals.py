@@ -0,0 +1,46 @@
+from django.db import IntegrityError, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from finance.models import UserAccount
+from tenant.models import Tenant
+from .auth import forget_user_tokens
+from .models import CustomUser
+
+
+@receiver(post_save, sender=CustomUser)
+def create_user_account(sender, instance, created, **kwargs):
+    """Create the financial account for a newly created user."""
+    if not created:
+        return
+    try:
+        # Savepoint so a clash can't break the caller's transaction
+        with transaction.atomic():
+            UserAccount.objects.create(user=instance)
+    except IntegrityError:
+        pass
+
+
+@receiver(post_save, sender=CustomUser)
+def invalidate_user_data(sender, instance, created, update_fields=None, **kwargs):
+    """Drop cached token checks; last_login isn't part of them."""
+    if created or update_fields == frozenset(['last_login']):
+        return
+    invalidate_user_caches(instance.pk)
+
+
+def invalidate_user_caches(user_id):
+    """Forget cached data for a user; call directly after queryset.update().
+
+    Serialized user data is keyed by updated_at, so it needs no delete here.
+    """
+    # Deactivation or a password change must not ride on a cached token check
+    forget_user_tokens(user_id)
+
+
+@receiver(post_save, sender=Tenant)
+@receiver(post_delete, sender=Tenant)
+def invalidate_tenant_user_data(sender, instance, **kwargs):
+    """tenant_info is part of the cached user data, so bump its version."""
+    CustomUser.objects.filter(pk=instance.user_id).update(updated_at=timezone.now())
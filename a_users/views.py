@@ -1,10 +1,11 @@
 import logging
-import traceback
 import django
 from django.contrib.auth import authenticate, login, logout
 from django.db import transaction
+from django.db.models import Count, Q
 from rest_framework import generics, status
 from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.exceptions import NotFound
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet
@@ -12,14 +13,17 @@ from rest_framework.views import APIView
 from django.utils import timezone
 from rest_framework_simplejwt.tokens import RefreshToken
 
-from finance import models
 from utils.generate_acess_token import generate_access_token
 from .models import CustomUser
+from .signals import invalidate_user_caches
 from utils.permissions import IsAdminOrPropertyManager
 from .serializers import (
     CustomUserCreateSerializer,
     UserListSerializer,
+    USER_LIST_VALUES,
+    user_list_rows,
     CustomUserSerializer,
+    get_cached_user_data,
     ProfileUpdateSerializer,
     ChangePasswordSerializer,
     LoginSerializer,
@@ -28,6 +32,17 @@ from .serializers import (
 
 logger = logging.getLogger(__name__)
 
+# Columns CustomUserSerializer never reads, for the user and its creator
+_RETRIEVE_DEFERRED = tuple(
+    prefix + field
+    for prefix in ('', 'created_by__')
+    for field in ('password', 'email_verification_token',
+                  'password_changed_at', 'last_login', 'updated_at')
+)
+
+# Tenants created by each user, read by the list serializers as tenant_count_ann
+_TENANT_COUNT = Count('created_users', filter=Q(created_users__role='tenant'))
+
 # Unchanged: LoginView
 
 
@@ -37,72 +52,39 @@ class LoginView(APIView):
 
     def post(self, request):
         """Login user and return tokens."""
-        try:
-            logger.info(f"Login attempt with data: {request.data}")
-
-            serializer = self.serializer_class(
-                data=request.data, context={'request': request})
-            logger.info(f"Serializer created: {serializer}")
-
-            if serializer.is_valid():
-                logger.info("Serializer is valid")
-                user = serializer.validated_data['user']
-                logger.info(f"User found: {user.email}")
-
-                try:
-                    tokens = generate_access_token(user)
-                    logger.info(f"Tokens generated: {tokens}")
-                except Exception as token_error:
-                    logger.error(f"Token generation failed: {token_error}")
-                    logger.error(
-                        f"Token generation traceback: {traceback.format_exc()}")
-                    return Response({
-                        'message': f'Token generation failed: {str(token_error)}'
-                    }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-                # Update last login
-                try:
-                    user.last_login = timezone.now()
-                    user.save(update_fields=['last_login'])
-                    logger.info("Last login updated")
-                except Exception as save_error:
-                    logger.warning(
-                        f"Failed to update last login: {save_error}")
-
-                try:
-                    user_data = CustomUserSerializer(user).data
-                    logger.info(f"User data serialized: {user_data}")
-                except Exception as user_error:
-                    logger.error(f"User serialization failed: {user_error}")
-                    user_data = {
-                        'id': user.id,
-                        'username': user.username,
-                        'email': user.email,
-                        'role': user.role
-                    }  # Fallback
-
-                response_data = {
-                    'message': 'Login successful',
-                    'user': user_data,
-                    'tokens': tokens
-                }
-
-                logger.info(f"Sending response: {response_data}")
-                return Response(response_data, status=status.HTTP_200_OK)
-            else:
-                logger.warning(
-                    f"Serializer validation failed: {serializer.errors}")
-                return Response({
-                    'message': serializer.errors.get('non_field_errors', ['Invalid credentials'])[0]
-                }, status=status.HTTP_400_BAD_REQUEST)
+        serializer = self.serializer_class(
+            data=request.data, context={'request': request})
 
-        except Exception as e:
-            logger.error(f"Unexpected error in login view: {e}")
-            logger.error(f"Login view traceback: {traceback.format_exc()}")
+        if not serializer.is_valid():
+            logger.info("Login rejected identifier=%s",
+                        request.data.get('identifier'))
             return Response({
-                'message': f'Internal server error: {str(e)}'
+                'message': serializer.errors.get('non_field_errors', ['Invalid credentials'])[0]
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        user = serializer.validated_data['user']
+        try:
+            tokens = generate_access_token(user)
+
+            # Plain UPDATE: no save() machinery or post_save receivers
+            user.last_login = timezone.now()
+            CustomUser.objects.filter(pk=user.pk).update(
+                last_login=user.last_login)
+
+            response_data = {
+                'message': 'Login successful',
+                'user': get_cached_user_data(user),
+                'tokens': tokens
+            }
+        except Exception:
+            logger.exception("Login failed for user id=%s", user.pk)
+            return Response({
+                'message': 'Internal server error'
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+        logger.info("User logged in id=%s", user.pk)
+        return Response(response_data, status=status.HTTP_200_OK)
+
 # Unchanged: RegisterView
 
 
@@ -122,13 +104,13 @@ class RegisterView(APIView):
                 refresh = RefreshToken.for_user(user)
                 access_token = refresh.access_token
 
-                logger.info(
-                    f"New user registered: {user.email} with role {user.role}")
+                logger.info("New user registered: %s with role %s",
+                            user.email, user.role)
 
                 return Response({
                     'access': str(access_token),
                     'refresh': str(refresh),
-                    'user': CustomUserSerializer(user).data,
+                    'user': get_cached_user_data(user),
                     'message': 'Registration successful. Please verify your email to activate your account.'
                 }, status=status.HTTP_201_CREATED)
 
@@ -150,11 +132,11 @@ class LogoutView(APIView):
 
             token = RefreshToken(refresh_token)
             token.blacklist()
-            logger.info(f"User logged out: {request.user.email}")
+            logger.info("User logged out: %s", request.user.email)
             return Response({"message": "Logout successful"}, status=status.HTTP_200_OK)
         except Exception as e:
-            logger.error(
-                f"Logout failed for user {request.user.email}: {str(e)}")
+            logger.error("Logout failed for user %s: %s",
+                         request.user.email, e)
             return Response(
                 {"detail": "Invalid token or logout failed"},
                 status=status.HTTP_400_BAD_REQUEST
@@ -174,7 +156,7 @@ class UserViewSet(ModelViewSet):
         # Property managers see only users they created + themselves
         if user.role == 'property_manager':
             queryset = queryset.filter(
-                models.Q(created_by=user) | models.Q(id=user.id)
+                Q(created_by=user) | Q(id=user.id)
             )
         elif user.role != 'admin':
             queryset = queryset.filter(id=user.id)
@@ -188,8 +170,28 @@ class UserViewSet(ModelViewSet):
         if self.action == 'tenant_users':
             queryset = queryset.filter(role='tenant')
 
+        # UserListSerializer reads the tenant count from this annotation
+        if self.action in ['list', 'tenant_users', 'my_created_users']:
+            queryset = queryset.annotate(tenant_count_ann=_TENANT_COUNT)
+        else:
+            # CustomUserSerializer.get_tenant_info reads the tenant profile
+            queryset = queryset.select_related('tenant_profile')
+
+        # retrieve only renders; actions that save need the full row
+        if self.action == 'retrieve':
+            queryset = queryset.defer(*_RETRIEVE_DEFERRED)
+
         return queryset
 
+    def list(self, request, *args, **kwargs):
+        """List users from a values() projection, skipping ModelSerializer."""
+        queryset = self.filter_queryset(self.get_queryset())
+        rows = queryset.values(*USER_LIST_VALUES)
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(user_list_rows(page))
+        return Response(user_list_rows(rows))
+
     def get_serializer_class(self):
         """Use appropriate serializer based on action."""
         if self.action == 'list':
@@ -222,33 +224,20 @@ class UserViewSet(ModelViewSet):
         - Property Manager: Can create tenant, caretaker, agent
         """
         creator = request.user
-        role = request.data.get('role')
-
-        logger.info(f"Creating user with role '{role}' by {creator.email}")
-
-        # Role creation permissions
-        allowed_roles = {
-            'admin': ['admin'],
-            'property_manager': ['tenant', 'caretaker', 'agent'],
-        }.get(creator.role, [])
-
-        if creator.role != 'admin' and role not in allowed_roles:
-            return Response(
-                {'error': f"You can only create users with roles: {', '.join(allowed_roles)}"},
-                status=status.HTTP_403_FORBIDDEN
-            )
 
+        # The role check runs in CustomUserCreateSerializer.validate_role
         serializer = self.get_serializer(data=request.data)
         if serializer.is_valid():
+            role = serializer.validated_data.get('role', 'tenant')
             with transaction.atomic():
                 user = serializer.save(created_by=creator)
-                logger.info(
-                    f"User {user.email} created successfully by {creator.email}")
+                logger.info("User %s created successfully by %s",
+                            user.email, creator.email)
                 return Response({
-                    'user': CustomUserSerializer(user).data,
+                    'user': get_cached_user_data(user),
                     'message': f'{role.capitalize()} created successfully'
                 }, status=status.HTTP_201_CREATED)
-        logger.error(f"User creation failed: {serializer.errors}")
+        logger.warning("User creation failed: %s", serializer.errors)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     # Keep create_tenant for backward compatibility
@@ -268,34 +257,45 @@ class UserViewSet(ModelViewSet):
     def my_created_users(self, request):
         if request.user.role not in ['admin', 'property_manager']:
             return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
-        users = CustomUser.objects.filter(created_by=request.user)
-        serializer = UserListSerializer(users, many=True)
-        return Response(serializer.data)
+        # Same base queryset and projection as list()
+        users = self.get_queryset().filter(created_by=request.user)
+        return Response(user_list_rows(users.values(*USER_LIST_VALUES)))
 
     @action(detail=False, methods=['get'])
     def tenant_users(self, request):
-        tenants = self.get_queryset().filter(role='tenant')
-        serializer = UserListSerializer(tenants, many=True)
-        return Response(serializer.data)
+        # get_queryset already restricts this action to tenants
+        tenants = self.get_queryset()
+        return Response(user_list_rows(tenants.values(*USER_LIST_VALUES)))
 
     @action(detail=True, methods=['post'])
     def deactivate(self, request, pk=None):
         if request.user.role != 'admin':
             return Response({'error': 'Only admins can deactivate users'}, status=status.HTTP_403_FORBIDDEN)
-        user = self.get_object()
-        user.is_active = False
-        user.user_status = CustomUser.UserStatus.INACTIVE.value
-        user.save()
-        logger.info(f"User {user.email} deactivated by {request.user.email}")
-        return Response({'message': f'User {user.email} deactivated'})
+        email = self._set_active(pk, False, CustomUser.UserStatus.INACTIVE)
+        logger.info("User %s deactivated by %s", email, request.user.email)
+        return Response({'message': f'User {email} deactivated'})
 
     @action(detail=True, methods=['post'])
     def reactivate(self, request, pk=None):
         if request.user.role != 'admin':
             return Response({'error': 'Only admins can reactivate users'}, status=status.HTTP_403_FORBIDDEN)
-        user = self.get_object()
-        user.is_active = True
-        user.user_status = CustomUser.UserStatus.ACTIVE.value
-        user.save()
-        logger.info(f"User {user.email} reactivated by {request.user.email}")
-        return Response({'message': f'User {user.email} reactivated'})
+        email = self._set_active(pk, True, CustomUser.UserStatus.ACTIVE)
+        logger.info("User %s reactivated by %s", email, request.user.email)
+        return Response({'message': f'User {email} reactivated'})
+
+    def _set_active(self, pk, is_active, user_status):
+        """Flip is_active/user_status with a single UPDATE; returns the email."""
+        try:
+            user_id = int(pk)
+        except (TypeError, ValueError):
+            raise NotFound()
+        updated = CustomUser.objects.filter(pk=user_id).update(
+            is_active=is_active,
+            user_status=user_status.value,
+            updated_at=timezone.now(),
+        )
+        if updated == 0:
+            raise NotFound()
+        # update() sends no post_save, so clear the user's caches here
+        invalidate_user_caches(user_id)
+        return CustomUser.objects.values_list('email', flat=True).get(pk=user_id)
@@ -2,10 +2,14 @@
 
 from django.core.management.base import BaseCommand
 from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Exists, OuterRef
 from finance.models import UserAccount
 
 User = get_user_model()
 
+BATCH_SIZE = 1000
+
 
 class Command(BaseCommand):
     help = 'Create UserAccount for existing users who don\'t have one'
@@ -20,44 +24,60 @@ class Command(BaseCommand):
     def handle(self, *args, **options):
         dry_run = options['dry_run']
 
-        # Find users without accounts
-        users_without_accounts = User.objects.filter(account__isnull=True)
+        # Find users without accounts. NOT EXISTS on the unique user_id index
+        # that the OneToOneField already creates plans as an anti-join.
+        users_without_accounts = User.objects.filter(
+            ~Exists(UserAccount.objects.filter(user_id=OuterRef('pk'))))
 
-        if not users_without_accounts.exists():
+        count = users_without_accounts.count()
+        if not count:
             self.stdout.write(
                 self.style.SUCCESS('All users already have accounts.')
             )
             return
 
-        count = users_without_accounts.count()
-
         if dry_run:
             self.stdout.write(
                 self.style.WARNING(
                     f'DRY RUN: Would create {count} user accounts for:'
                 )
             )
-            for user in users_without_accounts:
+            users = users_without_accounts.only('id', 'username', 'email')
+            for user in users.iterator(chunk_size=2000):
                 self.stdout.write(f'  - {user.username} ({user.email})')
         else:
             self.stdout.write(f'Creating {count} user accounts...')
 
-            created_count = 0
-            for user in users_without_accounts:
-                try:
-                    UserAccount.objects.create(user=user)
-                    created_count += 1
-                    self.stdout.write(
-                        f'  ✓ Created account for {user.username}')
-                except Exception as e:
-                    self.stdout.write(
-                        self.style.ERROR(
-                            f'  ✗ Failed to create account for {user.username}: {e}'
-                        )
-                    )
+            # Stream user ids and INSERT every BATCH_SIZE of them, so memory
+            # stays flat however many users there are. Accounts created
+            # concurrently by the post_save receiver are skipped.
+            user_ids = users_without_accounts.values_list('id', flat=True)
+            processed_count = 0
+            batch = []
+            with transaction.atomic():
+                # ignore_conflicts hides which rows were inserted, so count
+                # the accounts themselves
+                accounts_before = UserAccount.objects.count()
+                for user_id in user_ids.iterator(chunk_size=2000):
+                    batch.append(UserAccount(user_id=user_id))
+                    if len(batch) >= BATCH_SIZE:
+                        processed_count += self._flush(batch)
+                processed_count += self._flush(batch)
+                created_count = UserAccount.objects.count() - accounts_before
 
             self.stdout.write(
                 self.style.SUCCESS(
-                    f'Successfully created {created_count} user accounts.'
+                    f'Processed {processed_count} users; '
+                    f'created {created_count} user accounts.'
                 )
             )
+
+    @staticmethod
+    def _flush(batch):
+        """Insert and clear the pending accounts, returning how many were sent."""
+        if not batch:
+            return 0
+        UserAccount.objects.bulk_create(batch, ignore_conflicts=True)
+        sent = len(batch)
+        batch.clear()
+        return sent
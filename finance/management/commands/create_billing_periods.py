@@ -1,8 +1,18 @@
 from django.core.management.base import BaseCommand
+from django.db import transaction
 from django.utils import timezone
-from dateutil.relativedelta import relativedelta
 from finance.models import BillingPeriod
-from datetime import date
+from datetime import date, timedelta
+
+
+def iter_periods(start, count):
+    """Yield (first_day, last_day, due_date, name) for `count` months from `start`."""
+    year, month = start.year, start.month
+    for _ in range(count):
+        first = date(year, month, 1)
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+        last = date(year, month, 1) - timedelta(days=1)
+        yield first, last, first + timedelta(days=5), first.strftime('%B %Y')
 
 
 class Command(BaseCommand):
@@ -19,60 +29,63 @@ class Command(BaseCommand):
     def handle(self, *args, **options):
         months = options['months']
         today = date.today()
-        created_count = 0
-        updated_count = 0
 
         self.stdout.write(self.style.MIGRATE_HEADING(
             f'Creating billing periods for the next {months} months...'
         ))
 
-        for i in range(months):
-            start_date = today + relativedelta(months=i, day=1)
-            end_date = start_date + relativedelta(months=1, days=-1)
-            due_date = start_date + relativedelta(days=5)  # Due on 5th of month
-
-            period_name = start_date.strftime('%B %Y')
-
-            # Get or create billing period
-            period, created = BillingPeriod.objects.get_or_create(
+        desired = [
+            BillingPeriod(
                 start_date=start_date,
-                defaults={
-                    'name': period_name,
-                    'period_type': 'monthly',
-                    'end_date': end_date,
-                    'due_date': due_date,
-                    'is_active': True,
-                }
+                end_date=end_date,
+                due_date=due_date,
+                name=name,
+                period_type='monthly',
+                is_active=True,
             )
+            for start_date, end_date, due_date, name in iter_periods(today, months)
+        ]
+
+        # One SELECT for the existing periods, then one INSERT and one UPDATE
+        existing = {
+            period.start_date: period
+            for period in BillingPeriod.objects.filter(
+                start_date__in=[d.start_date for d in desired])
+        }
 
-            if created:
-                created_count += 1
+        to_create = []
+        to_update = []
+        now = timezone.now()
+        for wanted in desired:
+            period = existing.get(wanted.start_date)
+            if period is None:
+                to_create.append(wanted)
                 self.stdout.write(self.style.SUCCESS(
-                    f'  [+] Created: {period_name} ({start_date} to {end_date})'
+                    f'  [+] Created: {wanted.name} ({wanted.start_date} to {wanted.end_date})'
+                ))
+            elif (period.name, period.end_date, period.due_date) != (
+                    wanted.name, wanted.end_date, wanted.due_date):
+                period.name = wanted.name
+                period.end_date = wanted.end_date
+                period.due_date = wanted.due_date
+                period.updated_at = now
+                to_update.append(period)
+                self.stdout.write(self.style.WARNING(
+                    f'  [*] Updated: {wanted.name}'
                 ))
             else:
-                # Update existing period if needed
-                updated = False
-                if period.name != period_name:
-                    period.name = period_name
-                    updated = True
-                if period.end_date != end_date:
-                    period.end_date = end_date
-                    updated = True
-                if period.due_date != due_date:
-                    period.due_date = due_date
-                    updated = True
+                self.stdout.write(
+                    f'  - Exists: {wanted.name}'
+                )
 
-                if updated:
-                    period.save()
-                    updated_count += 1
-                    self.stdout.write(self.style.WARNING(
-                        f'  [*] Updated: {period_name}'
-                    ))
-                else:
-                    self.stdout.write(
-                        f'  - Exists: {period_name}'
-                    )
+        with transaction.atomic():
+            BillingPeriod.objects.bulk_create(to_create)
+            BillingPeriod.objects.bulk_update(
+                to_update, ['name', 'end_date', 'due_date', 'updated_at'])
+            # bulk_create/bulk_update send no signals
+            transaction.on_commit(BillingPeriod.clear_current_cache)
+        created_count = len(to_create)
+        updated_count = len(to_update)
 
         self.stdout.write(self.style.SUCCESS(
             f'\n[SUCCESS] Successfully processed billing periods!'
@@ -1,10 +1,25 @@
+import hashlib
+import json
+
+from django.core.cache import cache
 from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
 from finance.models import ChargeType
 
+SEED_SIGNATURE_KEY = 'charge_types_seed_sig'
+
 
 class Command(BaseCommand):
     help = 'Create initial charge types for the system'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Re-check every charge type even if the seed data is unchanged',
+        )
+
     def handle(self, *args, **options):
         self.stdout.write(self.style.MIGRATE_HEADING(
             'Creating charge types...'
@@ -111,38 +126,64 @@ class Command(BaseCommand):
             },
         ]
 
-        created_count = 0
-        existing_count = 0
+        # Skip the sync when this exact seed list was already applied. Only
+        # effective with a shared cache backend; LocMemCache starts empty.
+        signature = hashlib.md5(
+            json.dumps(charge_types, sort_keys=True).encode()).hexdigest()
+        if (not options['force']
+                and cache.get(SEED_SIGNATURE_KEY) == signature
+                and ChargeType.objects.count() >= len(charge_types)):
+            self.stdout.write(self.style.SUCCESS(
+                '[SUCCESS] Charge types already up to date.'
+            ))
+            return
 
-        for charge_type_data in charge_types:
-            charge_type, created = ChargeType.objects.get_or_create(
-                name=charge_type_data['name'],
-                defaults=charge_type_data
-            )
+        # One SELECT for the existing rows, then one INSERT and one UPDATE
+        existing = {
+            charge_type.name: charge_type
+            for charge_type in ChargeType.objects.filter(
+                name__in=[d['name'] for d in charge_types])
+        }
+        update_fields = [key for key in charge_types[0] if key != 'name']
 
-            if created:
-                created_count += 1
+        to_create = []
+        to_update = []
+        now = timezone.now()
+        for charge_type_data in charge_types:
+            charge_type = existing.get(charge_type_data['name'])
+            if charge_type is None:
+                to_create.append(ChargeType(**charge_type_data))
                 self.stdout.write(self.style.SUCCESS(
-                    f'  [+] Created: {charge_type.name}'
+                    f'  [+] Created: {charge_type_data["name"]}'
+                ))
+                continue
+
+            # Update existing charge types
+            updated = False
+            for key in update_fields:
+                value = charge_type_data[key]
+                if getattr(charge_type, key) != value:
+                    setattr(charge_type, key, value)
+                    updated = True
+
+            if updated:
+                charge_type.updated_at = now
+                to_update.append(charge_type)
+                self.stdout.write(self.style.WARNING(
+                    f'  [*] Updated: {charge_type.name}'
                 ))
             else:
-                existing_count += 1
-                # Update existing charge types
-                updated = False
-                for key, value in charge_type_data.items():
-                    if key != 'name' and getattr(charge_type, key) != value:
-                        setattr(charge_type, key, value)
-                        updated = True
+                self.stdout.write(
+                    f'  - Exists: {charge_type.name}'
+                )
 
-                if updated:
-                    charge_type.save()
-                    self.stdout.write(self.style.WARNING(
-                        f'  [*] Updated: {charge_type.name}'
-                    ))
-                else:
-                    self.stdout.write(
-                        f'  - Exists: {charge_type.name}'
-                    )
+        with transaction.atomic():
+            ChargeType.objects.bulk_create(to_create, ignore_conflicts=True)
+            ChargeType.objects.bulk_update(
+                to_update, update_fields + ['updated_at'])
+        cache.set(SEED_SIGNATURE_KEY, signature, None)
+        created_count = len(to_create)
+        existing_count = len(existing)
 
         self.stdout.write(self.style.SUCCESS(
             f'\n[SUCCESS] Successfully processed charge types!'
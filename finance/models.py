@@ -1,7 +1,11 @@
-from django.db import transaction
+from django.db import IntegrityError, connection, transaction
 from django.db import models
+from django.db.models import Case, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
-from utils.common import EnumWithChoices
+from utils.common import EnumWithChoices, uuid7
+from utils.today import today as current_date
 from a_core.settings import CURRENCY
 from django.db import models
 from django.contrib.auth import get_user_model
@@ -9,11 +13,60 @@ from django.utils.translation import gettext_lazy as _
 from django.core.validators import MinValueValidator
 from decimal import Decimal
 from datetime import date, timedelta
-import uuid
-from django.db.models.signals import post_save
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 
 
+# Sequences already checked/created by this process
+_READY_SEQUENCES = set()
+
+
+def next_document_number(sequence, model, field):
+    """Next value of a PostgreSQL sequence backing invoice/receipt numbers."""
+    return next_document_numbers(sequence, model, field, 1)[0]
+
+
+def next_document_numbers(sequence, model, field, count):
+    """Reserve count values of a PostgreSQL sequence in one round trip.
+
+    nextval() is atomic, so concurrent inserts never get the same number.
+    On first use the sequence is created and moved past the highest numeric
+    suffix already stored in model.field, so it can't collide with numbers
+    issued by the old count()-based scheme.
+    """
+    with connection.cursor() as cursor:
+        if sequence not in _READY_SEQUENCES:
+            cursor.execute(f"CREATE SEQUENCE IF NOT EXISTS {sequence}")
+            cursor.execute(
+                f"SELECT COALESCE(MAX(CAST(substring({field} FROM '([0-9]+)$') "
+                f"AS bigint)), 0) FROM {model._meta.db_table}"
+            )
+            highest = cursor.fetchone()[0]
+            if highest:
+                cursor.execute(
+                    f"SELECT setval('{sequence}', GREATEST(%s, last_value)) "
+                    f"FROM {sequence}",
+                    [highest],
+                )
+            # Only once the CREATE SEQUENCE is durable: if the surrounding
+            # atomic block rolls back, the next call must create it again
+            transaction.on_commit(lambda: _READY_SEQUENCES.add(sequence))
+        cursor.execute(
+            "SELECT nextval(%s) FROM generate_series(1, %s)", [sequence, count])
+        return [row[0] for row in cursor.fetchall()]
+
+
+class AutoReference(models.Func):
+    """SQL for 'AUTO-<YYYYMMDDHHMMSS>-<6 random hex chars>' references"""
+    template = (
+        "'AUTO-' || to_char(clock_timestamp(), 'YYYYMMDDHH24MISS') || '-' "
+        "|| upper(substr(md5(random()::text), 1, 6))"
+    )
+    output_field = models.CharField()
+
+
 class TimeStampedModel(models.Model):
     """Abstract base class with created_at and updated_at fields"""
     created_at = models.DateTimeField(
@@ -76,19 +129,7 @@ class UserAccount(TimeStampedModel):
         verbose_name = _("User Account")
         verbose_name_plural = _("User Accounts")
 
-    # Signal to automatically create UserAccount when a CustomUser is created
-
-    @receiver(post_save, sender="a_users.CustomUser")
-    def create_user_account(sender, instance, created, **kwargs):
-        """Create a UserAccount when a new CustomUser is created"""
-        if created:
-            UserAccount.objects.get_or_create(user=instance)
-
-    @receiver(post_save, sender="a_users.CustomUser")
-    def save_user_account(sender, instance, **kwargs):
-        """Save the UserAccount when the CustomUser is saved"""
-        if hasattr(instance, 'account'):
-            instance.account.save()
+    # UserAccount rows for new users are created in a_users.signals
 
 
 class BillingPeriod(TimeStampedModel):
@@ -126,13 +167,13 @@ class BillingPeriod(TimeStampedModel):
 
     @property
     def is_current(self):
-        today = date.today()
+        today = current_date()
         return self.start_date <= today <= self.end_date and not self.is_closed
 
     @property
     def days_until_due(self):
         """Days until payment is due"""
-        return (self.due_date - date.today()).days
+        return (self.due_date - current_date()).days
     is_closed = models.BooleanField(
         default=False,
         help_text=_("Whether billing period is closed for new charges")
@@ -165,6 +206,65 @@ class BillingPeriod(TimeStampedModel):
         """Check if charges can be added to this period"""
         return not self.is_closed and self.is_active
 
+    def generate_invoices(self, tenant_ids=None, auto_send=False, created_by=None):
+        """Invoice the active tenants (or just tenant_ids) for this period.
+
+        Shared by BillingPeriodViewSet.generate_invoices and the Celery
+        task of the same name. Returns Invoice.generate_for_period's
+        (invoices, errors).
+        """
+        from tenant.models import Tenant
+
+        # is_active is a property on Tenant, so filter on status
+        tenants = Tenant.objects.filter(status=Tenant.TenantStatus.ACTIVE)
+        if tenant_ids:
+            tenants = tenants.filter(id__in=tenant_ids)
+
+        invoices, errors = Invoice.generate_for_period(self, tenants, created_by)
+        if auto_send:
+            Invoice.objects.filter(
+                pk__in=[invoice.pk for invoice in invoices], status='draft'
+            ).update(status='sent', updated_at=timezone.now())
+        return invoices, errors
+
+    @classmethod
+    def get_current(cls):
+        """The active period covering today, memoized in the cache"""
+        today = current_date()
+        key = _current_period_cache_key(today)
+        period = cache.get(key)
+        if period is None:
+            period = cls.objects.filter(
+                start_date__lte=today,
+                end_date__gte=today,
+                is_active=True
+            ).order_by('-start_date').first()
+            # Misses aren't cached, so a period created for today shows up
+            # on the next call
+            if period is not None:
+                cache.set(key, period, CURRENT_PERIOD_CACHE_TIMEOUT)
+        return period
+
+    @staticmethod
+    def clear_current_cache():
+        """Forget the cached current period; for writes that skip signals"""
+        cache.delete(_current_period_cache_key(current_date()))
+
+
+# Only this process's cache is invalidated by the receivers below; without
+# a shared cache (no REDIS_URL) keep entries short so other workers catch up
+CURRENT_PERIOD_CACHE_TIMEOUT = 3600 if getattr(settings, 'REDIS_URL', None) else 60
+
+
+def _current_period_cache_key(day):
+    return f'billing:current:{day.isoformat()}'
+
+
+@receiver(post_save, sender=BillingPeriod)
+@receiver(post_delete, sender=BillingPeriod)
+def invalidate_current_period(sender, instance, **kwargs):
+    BillingPeriod.clear_current_cache()
+
 
 class ChargeType(TimeStampedModel):
     """Types of charges that can be applied"""
@@ -190,6 +290,96 @@ class ChargeType(TimeStampedModel):
         return self.name
 
 
+# Invalidation below only reaches this process's cache; without a shared
+# cache (no REDIS_URL) keep entries short so other workers catch up
+CHARGE_TYPE_CACHE_TIMEOUT = 3600 if getattr(settings, 'REDIS_URL', None) else 60
+
+
+def _charge_type_cache_key(name):
+    return f'charge_type:{name}'
+
+
+def get_charge_type(name, defaults):
+    """ChargeType.objects.get_or_create(name=...)[0], memoized in the cache"""
+    key = _charge_type_cache_key(name)
+    charge_type = cache.get(key)
+    if charge_type is None:
+        charge_type, _ = ChargeType.objects.get_or_create(
+            name=name, defaults=defaults)
+        cache.set(key, charge_type, CHARGE_TYPE_CACHE_TIMEOUT)
+    return charge_type
+
+
+@receiver(pre_save, sender=ChargeType)
+def remember_charge_type_name(sender, instance, **kwargs):
+    # A rename must also drop the entry cached under the old name
+    if instance.pk is not None:
+        instance._cached_name = ChargeType.objects.filter(
+            pk=instance.pk).values_list('name', flat=True).first()
+
+
+@receiver(post_save, sender=ChargeType)
+@receiver(post_delete, sender=ChargeType)
+def invalidate_charge_type(sender, instance, **kwargs):
+    names = {instance.name, getattr(instance, '_cached_name', None)}
+    cache.delete_many([_charge_type_cache_key(name) for name in names if name])
+
+
+def _rent_amount(tenant):
+    """A tenant's positive monthly rent as a Decimal, else None.
+
+    Like ensure_rent_item, a tenant whose rent can't be read (no unit)
+    gets no rent item rather than failing the whole run.
+    """
+    try:
+        rent_amount = tenant.monthly_rent
+    except Exception:
+        return None
+    if rent_amount is None or Decimal(str(rent_amount)) <= Decimal('0.00'):
+        return None
+    return Decimal(str(rent_amount))
+
+
+class RelatedManager(models.Manager):
+    """Default manager that joins the relations __str__ and list views read"""
+
+    def __init__(self, *related):
+        super().__init__()
+        self.related = related
+
+    def get_queryset(self):
+        return super().get_queryset().select_related(*self.related)
+
+
+# Invoice statuses that can still fall overdue
+OPEN_INVOICE_STATUSES = ['draft', 'sent', 'partial', 'overdue']
+
+
+class InvoiceQuerySet(models.QuerySet):
+    def recalculate_totals(self):
+        """Invoice.recalculate_totals for every row, as one UPDATE"""
+        item_totals = InvoiceItem.objects.filter(
+            invoice=OuterRef('pk')
+        ).values('invoice').annotate(total=Sum('line_total')).values('total')
+        subtotal = Coalesce(Subquery(item_totals), Value(Decimal('0.00')))
+        return self.update(subtotal=subtotal,
+                           total_amount=subtotal + F('tax_amount'))
+
+    def overdue(self, today=None):
+        """Open invoices past their due date (served by open_invoice_due_idx)"""
+        return self.filter(due_date__lt=today or current_date(),
+                           status__in=OPEN_INVOICE_STATUSES)
+
+    def with_overdue(self, today=None):
+        """Annotate is_overdue_ann so Invoice.is_overdue needs no per-row date math"""
+        return self.annotate(is_overdue_ann=Case(
+            When(due_date__lt=today or current_date(),
+                 status__in=OPEN_INVOICE_STATUSES, then=Value(True)),
+            default=Value(False),
+            output_field=models.BooleanField(),
+        ))
+
+
 class Invoice(TimeStampedModel):
     """Invoice model for billing"""
     STATUS_CHOICES = [
@@ -241,6 +431,12 @@ class Invoice(TimeStampedModel):
         decimal_places=2,
         default=Decimal('0.00')
     )
+    # Amount still owed on invoice, kept by PostgreSQL
+    balance_due = models.GeneratedField(
+        expression=F('total_amount') - F('amount_paid'),
+        output_field=models.DecimalField(max_digits=12, decimal_places=2),
+        db_persist=True,
+    )
 
     notes = models.TextField(blank=True)
     created_by = models.ForeignKey(
@@ -250,12 +446,18 @@ class Invoice(TimeStampedModel):
         related_name="created_invoices"
     )
 
+    objects = RelatedManager.from_queryset(InvoiceQuerySet)(
+        'tenant__user', 'billing_period')
+
     class Meta:
         ordering = ['-issue_date']
         indexes = [
             models.Index(fields=['tenant', 'status']),
             models.Index(fields=['due_date']),
             models.Index(fields=['billing_period']),
+            # Only open invoices, a small slice of the table
+            models.Index(fields=['due_date'], name='open_invoice_due_idx',
+                         condition=Q(status__in=OPEN_INVOICE_STATUSES)),
         ]
 
     def save(self, *args, **kwargs):
@@ -265,14 +467,17 @@ class Invoice(TimeStampedModel):
 
     def generate_invoice_number(self):
         """Generate unique invoice number"""
+        return self.generate_invoice_numbers(1)[0]
+
+    @staticmethod
+    def generate_invoice_numbers(count):
+        """Generate count unique invoice numbers"""
         from django.utils import timezone
-        year = timezone.now().year
-        month = timezone.now().month
-        count = Invoice.objects.filter(
-            created_at__year=year,
-            created_at__month=month
-        ).count() + 1
-        return f"INV-{year}{month:02d}-{count:04d}"
+        now = timezone.now()
+        numbers = next_document_numbers(
+            'finance_invoice_number_seq', Invoice, 'invoice_number', count)
+        return [f"INV-{now.year}{now.month:02d}-{number:04d}"
+                for number in numbers]
 
     @classmethod
     def generate_for_tenant(cls, tenant, billing_period, created_by=None):
@@ -280,69 +485,120 @@ class Invoice(TimeStampedModel):
         Generate invoice for a tenant for a billing period
         Includes rent and all utility charges
         """
-        from django.db import transaction
+        tenants = type(tenant).objects.filter(pk=tenant.pk)
+        invoices, _ = cls.generate_for_period(billing_period, tenants, created_by)
+        return invoices[0]
 
-        with transaction.atomic():
-            # Check if invoice already exists
-            existing = cls.objects.filter(
-                tenant=tenant,
-                billing_period=billing_period
-            ).first()
-
-            if existing:
-                return existing
-
-            # Create invoice
-            invoice = cls.objects.create(
-                tenant=tenant,
-                billing_period=billing_period,
-                due_date=billing_period.due_date,
-                created_by=created_by,
-                status='draft'
-            )
-
-            # Add rent charge from tenant.monthly_rent via helper (idempotent)
-            invoice.ensure_rent_item()
+    @classmethod
+    def generate_for_period(cls, billing_period, tenants, created_by=None):
+        """
+        Generate invoices for a queryset of tenants for a billing period.
+        Tenants that already have one keep it. Runs a fixed number of
+        queries however many tenants there are.
 
-            # Add utility charges
-            utility_charges = UtilityCharge.objects.filter(
-                tenant=tenant,
-                billing_period=billing_period,
-                is_billed=False
+        Returns (invoices, errors): every invoice of the given tenants for
+        the period, and one {'tenant_id', 'tenant_name', 'error'} entry per
+        problem found for a tenant.
+        """
+        errors = []
+        with transaction.atomic():
+            tenant_ids = list(tenants.values_list('pk', flat=True))
+            new_tenants = list(
+                tenants.exclude(invoices__billing_period=billing_period)
+                .select_related('unit', 'user')
             )
 
-            for utility_charge in utility_charges:
-                utility_charge.add_to_invoice(invoice)
-
-            # Calculate totals
-            invoice.recalculate_totals()
-
-            return invoice
+            if new_tenants:
+                numbers = cls.generate_invoice_numbers(len(new_tenants))
+                invoices = cls.objects.bulk_create([
+                    cls(
+                        invoice_number=number,
+                        tenant=tenant,
+                        billing_period=billing_period,
+                        due_date=billing_period.due_date,
+                        created_by=created_by,
+                        status='draft'
+                    )
+                    for tenant, number in zip(new_tenants, numbers)
+                ])
+
+                # Rent from tenant.monthly_rent, as in ensure_rent_item
+                rent_charge_type = get_charge_type(
+                    "Monthly Rent",
+                    defaults={
+                        'description': 'Monthly rent payment',
+                        'frequency': 'recurring',
+                        'is_system_charge': True
+                    }
+                )
+                rent_items = []
+                for invoice in invoices:
+                    rent_amount = _rent_amount(invoice.tenant)
+                    if rent_amount is None:
+                        continue
+                    rent_items.append(InvoiceItem(
+                        invoice=invoice,
+                        charge_type=rent_charge_type,
+                        description=f"Rent for {billing_period.name}",
+                        quantity=Decimal('1.00'),
+                        unit_price=rent_amount,
+                    ))
+                InvoiceItem.objects.bulk_create(
+                    rent_items, batch_size=500, ignore_conflicts=True)
+
+                # Unbilled utility charges of the new invoices' tenants,
+                # locked so a concurrent add_utility_charges can't bill
+                # one twice
+                invoices_by_tenant = {
+                    invoice.tenant_id: invoice for invoice in invoices}
+                _, skipped = UtilityCharge.bulk_add_to_invoices(
+                    UtilityCharge.objects.select_for_update(of=('self',)).filter(
+                        tenant__in=new_tenants,
+                        billing_period=billing_period,
+                        is_billed=False
+                    ),
+                    invoices_by_tenant
+                )
+                for charge in skipped:
+                    tenant = invoices_by_tenant[charge.tenant_id].tenant
+                    errors.append({
+                        'tenant_id': tenant.id,
+                        'tenant_name': tenant.user.get_full_name(),
+                        'error': f"Invoice already has a {charge.utility_type} Bill "
+                                 f"item; utility charge {charge.pk} left unbilled"
+                    })
+
+                cls.objects.filter(
+                    pk__in=[invoice.pk for invoice in invoices]
+                ).recalculate_totals()
+
+            invoices = list(cls.objects.filter(
+                tenant_id__in=tenant_ids, billing_period=billing_period))
+        return invoices, errors
 
     def recalculate_totals(self):
         """Recalculate invoice totals from items"""
-        items = self.items.all()
-        self.subtotal = sum(item.line_total for item in items)
+        # SUM() in the database instead of loading every item
+        self.subtotal = self.items.aggregate(
+            subtotal=Sum('line_total'))['subtotal'] or Decimal('0.00')
         self.total_amount = self.subtotal + self.tax_amount
-        self.save(update_fields=['subtotal', 'total_amount'])
+        type(self).objects.filter(pk=self.pk).update(
+            subtotal=self.subtotal, total_amount=self.total_amount)
+        self.balance_due = self.total_amount - self.amount_paid
 
     def ensure_rent_item(self):
         """Ensure a rent line item exists for the tenant for this billing period.
-        Uses tenant.monthly_rent as the unit_price. Idempotent.
+        Uses tenant.monthly_rent as the unit_price. Idempotent; callers
+        recalculate totals afterwards.
         """
         # Skip if tenant has no monthly rent info
-        tenant = self.tenant
-        try:
-            rent_amount = tenant.monthly_rent
-        except Exception:
-            return None
-
-        if rent_amount is None or Decimal(str(rent_amount)) <= Decimal('0.00'):
+        rent_amount = _rent_amount(self.tenant)
+        if rent_amount is None:
             return None
 
         # Find or create the rent charge type
-        rent_charge_type, _ = ChargeType.objects.get_or_create(
-            name="Monthly Rent",
+        rent_charge_type = get_charge_type(
+            "Monthly Rent",
             defaults={
                 'description': 'Monthly rent payment',
                 'frequency': 'recurring',
@@ -350,40 +606,33 @@ class Invoice(TimeStampedModel):
             }
         )
 
-        # If an item for Monthly Rent already exists for this invoice, skip
-        existing = self.items.filter(charge_type=rent_charge_type).first()
-        if existing:
-            return existing
-
-        # Create the rent item
-        item = InvoiceItem.objects.create(
-            invoice=self,
-            charge_type=rent_charge_type,
-            description=f"Rent for {self.billing_period.name}",
-            quantity=Decimal('1.00'),
-            unit_price=Decimal(str(rent_amount)),
-        )
-
-        # Refresh totals after adding rent
-        self.recalculate_totals()
-        return item
-
-    @property
-    def balance_due(self):
-        """Amount still owed on invoice"""
-        return self.total_amount - self.amount_paid
+        # ON CONFLICT DO NOTHING against uniq_invoice_chargetype, so an
+        # existing rent item is kept and concurrent calls can't duplicate it
+        InvoiceItem.objects.bulk_create([
+            InvoiceItem(
+                invoice=self,
+                charge_type=rent_charge_type,
+                description=f"Rent for {self.billing_period.name}",
+                quantity=Decimal('1.00'),
+                unit_price=rent_amount,
+            )
+        ], ignore_conflicts=True)
 
     @property
     def is_overdue(self):
         """Check if invoice is overdue"""
-        return date.today() > self.due_date and self.status not in ['paid', 'cancelled']
+        # Set by Invoice.objects.with_overdue() for list rendering
+        annotated = self.__dict__.get('is_overdue_ann')
+        if annotated is not None:
+            return annotated
+        return current_date() > self.due_date and self.status not in ['paid', 'cancelled']
 
     @property
     def days_overdue(self):
         """Days past due date"""
         if not self.is_overdue:
             return 0
-        return (date.today() - self.due_date).days
+        return (current_date() - self.due_date).days
 
     def __str__(self):
         return f"{self.invoice_number} - {self.tenant}"
@@ -412,18 +661,21 @@ class InvoiceItem(TimeStampedModel):
         decimal_places=2,
         validators=[MinValueValidator(Decimal('0.00'))]
     )
-    line_total = models.DecimalField(
-        max_digits=12,
-        decimal_places=2,
-        editable=False
+    # Computed by PostgreSQL on INSERT/UPDATE, so bulk_create works as-is
+    line_total = models.GeneratedField(
+        expression=F('quantity') * F('unit_price'),
+        output_field=models.DecimalField(max_digits=12, decimal_places=2),
+        db_persist=True,
     )
 
     class Meta:
         ordering = ['id']
-
-    def save(self, *args, **kwargs):
-        self.line_total = self.quantity * self.unit_price
-        super().save(*args, **kwargs)
+        constraints = [
+            models.UniqueConstraint(
+                fields=['invoice', 'charge_type'],
+                name='uniq_invoice_chargetype',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.description} - {self.line_total}"
@@ -448,8 +700,9 @@ class Transaction(TimeStampedModel):
         ('check', _('Check')),
         ('other', _('Other')),
     ]
+    # Time-ordered so inserts append to the unique index
     transaction_id = models.UUIDField(
-        default=uuid.uuid4,
+        default=uuid7,
         unique=True,
         editable=False
     )
@@ -503,32 +756,54 @@ class Transaction(TimeStampedModel):
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['account', '-created_at']),
-            models.Index(fields=['transaction_type']),
+            # An account's latest payment (UserAccountViewSet.summary)
+            models.Index(fields=['account', 'transaction_type', '-created_at'],
+                         name='txn_account_type_created_idx'),
+            # Also serves plain transaction_type filters
+            models.Index(fields=['transaction_type', 'created_at']),
             models.Index(fields=['invoice']),
         ]
 
     def save(self, *args, **kwargs):
         is_new = self.pk is None
-        super().save(*args, **kwargs)
+        if not is_new:
+            super().save(*args, **kwargs)
+            return
 
-        if is_new and not self.is_reversed:
-            self.update_account_balance()
+        # The row and its balance change commit or roll back together
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if not self.is_reversed:
+                self.update_account_balance()
 
     def update_account_balance(self):
         """Update the account balance based on transaction type"""
         if self.transaction_type in ['payment', 'refund', 'credit']:
             # Increase balance
-            self.account.balance += self.amount
+            self._apply_balance_delta(self.amount)
         else:
             # Decrease balance (charge, penalty, adjustment)
-            self.account.balance -= self.amount
+            self._apply_balance_delta(-self.amount)
 
-        self.account.save(update_fields=['balance'])
+    def _apply_balance_delta(self, delta):
+        """Add delta to the account balance in one atomic UPDATE (no lost updates)."""
+        UserAccount.objects.filter(pk=self.account_id).update(
+            balance=F('balance') + delta)
+        # Keep an already-loaded account object in step without re-reading it
+        if Transaction.account.is_cached(self):
+            self.account.balance += delta
 
+    @transaction.atomic
     def reverse(self, user, reason=""):
         """Reverse this transaction"""
-        if self.is_reversed:
+        # Claim the reversal with a conditional UPDATE so two concurrent
+        # calls can't both reverse the same transaction
+        claimed = Transaction.objects.filter(
+            pk=self.pk, is_reversed=False).update(is_reversed=True)
+        if not claimed:
             raise ValueError("Transaction already reversed")
+        self.is_reversed = True
+
         # Create reversal transaction
         reversal = Transaction.objects.create(
             account=self.account,
@@ -540,15 +815,10 @@ class Transaction(TimeStampedModel):
             is_reversed=True
         )
 
-        self.is_reversed = True
-        self.save(update_fields=['is_reversed'])
-
         if self.transaction_type in ['payment', 'refund', 'credit']:
-            self.account.balance -= self.amount
+            self._apply_balance_delta(-self.amount)
         else:
-            self.account.balance += self.amount
-
-        self.account.save(update_fields=['balance'])
+            self._apply_balance_delta(self.amount)
 
         return reversal
 
@@ -617,12 +887,18 @@ class UtilityCharge(TimeStampedModel):
         help_text=_("Whether this charge has been added to an invoice")
     )
 
+    objects = RelatedManager('tenant__user', 'billing_period')
+
     class Meta:
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['tenant', 'utility_type']),
             models.Index(fields=['billing_period']),
             models.Index(fields=['is_billed']),
+            # Unbilled charges of a period, as read by generate_for_period
+            models.Index(fields=['billing_period', 'tenant'],
+                         name='utilcharge_unbilled_idx',
+                         condition=Q(is_billed=False)),
         ]
         unique_together = ['tenant', 'utility_type', 'billing_period']
 
@@ -634,26 +910,95 @@ class UtilityCharge(TimeStampedModel):
         if self.is_billed:
             raise ValueError("Utility charge already billed")
         # Get or create utility charge type
-        charge_type, _ = ChargeType.objects.get_or_create(
-            name=f"{self.utility_type} Bill",
+        charge_type = get_charge_type(
+            f"{self.utility_type} Bill",
             defaults={
                 'description': f'{self.utility_type} utility charges',
                 'frequency': 'recurring',
                 'is_system_charge': True
             }
         )
-        invoice_item = InvoiceItem.objects.create(
-            invoice=invoice,
-            charge_type=charge_type,
-            description=self.description or f"{self.utility_type} - {self.billing_period.name}",
-            quantity=Decimal('1.00'),
-            unit_price=self.amount
-        )
+        try:
+            with transaction.atomic():
+                invoice_item = InvoiceItem.objects.create(
+                    invoice=invoice,
+                    charge_type=charge_type,
+                    description=self.description or f"{self.utility_type} - {self.billing_period.name}",
+                    quantity=Decimal('1.00'),
+                    unit_price=self.amount
+                )
+        except IntegrityError:
+            raise ValueError(f"Invoice already has a {charge_type.name} item")
         self.is_billed = True
-        self.save(update_fields=['is_billed'])
+        UtilityCharge.objects.filter(pk=self.pk).update(is_billed=True)
 
         return invoice_item
 
+    @classmethod
+    def bulk_add_to_invoices(cls, charges, invoices_by_tenant):
+        """Add unbilled utility charges to their tenant's invoice in bulk.
+
+        Returns (items, skipped). A charge whose type the invoice already
+        has an item for is skipped and stays unbilled, so it isn't lost.
+        """
+        charges = list(charges.select_related('billing_period'))
+        if not charges:
+            return [], []
+
+        # One SELECT for the charge types, one INSERT for any missing ones
+        type_names = {f"{charge.utility_type} Bill": charge.utility_type
+                      for charge in charges}
+        charge_types = {
+            charge_type.name: charge_type
+            for charge_type in ChargeType.objects.filter(name__in=type_names)
+        }
+        missing = [name for name in type_names if name not in charge_types]
+        if missing:
+            ChargeType.objects.bulk_create([
+                ChargeType(
+                    name=name,
+                    description=f'{type_names[name]} utility charges',
+                    frequency='recurring',
+                    is_system_charge=True,
+                )
+                for name in missing
+            ], ignore_conflicts=True)
+            charge_types.update(
+                (charge_type.name, charge_type)
+                for charge_type in ChargeType.objects.filter(name__in=missing)
+            )
+
+        # (invoice, charge type) pairs already taken (uniq_invoice_chargetype)
+        taken = set(InvoiceItem.objects.filter(
+            invoice__in=set(invoices_by_tenant.values()),
+            charge_type__in=charge_types.values(),
+        ).values_list('invoice_id', 'charge_type_id'))
+
+        quantity = Decimal('1.00')
+        items, billed, skipped = [], [], []
+        for charge in charges:
+            invoice = invoices_by_tenant[charge.tenant_id]
+            charge_type = charge_types[f"{charge.utility_type} Bill"]
+            if (invoice.pk, charge_type.pk) in taken:
+                skipped.append(charge)
+                continue
+            taken.add((invoice.pk, charge_type.pk))
+            billed.append(charge)
+            items.append(InvoiceItem(
+                invoice=invoice,
+                charge_type=charge_type,
+                description=charge.description or f"{charge.utility_type} - {charge.billing_period.name}",
+                quantity=quantity,
+                unit_price=charge.amount,
+            ))
+
+        # No ignore_conflicts: a racing insert raises and rolls the whole
+        # batch back rather than flagging a charge that has no item
+        InvoiceItem.objects.bulk_create(items, batch_size=500)
+        cls.objects.filter(pk__in=[charge.pk for charge in billed]).update(
+            is_billed=True)
+        return items, skipped
+
 
 class RentPayment(TimeStampedModel):
     """Dedicated rent payment tracking"""
@@ -724,13 +1069,18 @@ class RentPayment(TimeStampedModel):
 
     notes = models.TextField(blank=True)
 
+    objects = RelatedManager('tenant__user', 'billing_period')
+
     class Meta:
         ordering = ['-payment_date', '-created_at']
         indexes = [
             models.Index(fields=['tenant', 'billing_period']),
+            models.Index(fields=['tenant', 'status']),
             models.Index(fields=['payment_date']),
             models.Index(fields=['status']),
             models.Index(fields=['due_date']),
+            models.Index(fields=['due_date'], name='pending_rent_due_idx',
+                         condition=Q(status='pending')),
         ]
         # One rent payment per tenant per period
         unique_together = ['tenant', 'billing_period']
@@ -745,7 +1095,7 @@ class RentPayment(TimeStampedModel):
     @property
     def is_overdue(self):
         """Check if payment is overdue"""
-        return date.today() > self.due_date and self.status == 'pending'
+        return current_date() > self.due_date and self.status == 'pending'
 
     @property
     def total_amount_due(self):
@@ -767,9 +1117,22 @@ class RentPayment(TimeStampedModel):
             raise ValueError("Payment amount exceeds amount due")
 
         with transaction.atomic():
+            # Lock this payment, the tenant's account and the invoice so
+            # concurrent processing of the same rows runs one at a time
+            locked_status = RentPayment.objects.select_for_update().values_list(
+                'status', flat=True).get(pk=self.pk)
+            if locked_status not in ['pending', 'partial']:
+                raise ValueError(
+                    f"Cannot process payment with status {locked_status}")
+            account = UserAccount.objects.select_for_update().get(
+                user_id=self.tenant.user_id)
+            if self.invoice_id:
+                self.invoice = Invoice.objects.select_for_update(of=('self',)).get(
+                    pk=self.invoice_id)
+
             # Create transaction
             trans = Transaction.objects.create(
-                account=self.tenant.user.account,
+                account=account,
                 transaction_type='payment',
                 amount=payment_amount,
                 payment_method=self.payment_method,
@@ -781,15 +1144,25 @@ class RentPayment(TimeStampedModel):
 
             self.transaction = trans
 
-            # Update invoice if exists
+            # Update invoice if exists; amount and status are computed in
+            # the UPDATE itself so concurrent payments can't overwrite each other
             if self.invoice:
+                Invoice.objects.filter(pk=self.invoice_id).update(
+                    amount_paid=F('amount_paid') + payment_amount,
+                    status=Case(
+                        When(total_amount__lte=F('amount_paid') + payment_amount,
+                             then=Value('paid')),
+                        default=Value('partial'),
+                    ),
+                    updated_at=timezone.now(),
+                )
                 self.invoice.amount_paid += payment_amount
-
+                self.invoice.balance_due = (
+                    self.invoice.total_amount - self.invoice.amount_paid)
                 if self.invoice.amount_paid >= self.invoice.total_amount:
                     self.invoice.status = 'paid'
                 else:
                     self.invoice.status = 'partial'
-                self.invoice.save()
 
             # Update rent payment status
             if payment_amount >= self.amount:
@@ -897,13 +1270,10 @@ class Receipt(TimeStampedModel):
     def generate_receipt_number(self):
         """Generate unique receipt number"""
         from django.utils import timezone
-        year = timezone.now().year
-        month = timezone.now().month
-        count = Receipt.objects.filter(
-            created_at__year=year,
-            created_at__month=month
-        ).count() + 1
-        return f"RCP-{year}{month:02d}-{count:04d}"
+        now = timezone.now()
+        number = next_document_number(
+            'finance_receipt_number_seq', Receipt, 'receipt_number')
+        return f"RCP-{now.year}{now.month:02d}-{number:04d}"
 
     def __str__(self):
         return f"{self.receipt_number} - {self.tenant} - {CURRENCY}{self.amount}"
@@ -940,7 +1310,9 @@ class Payment(TimeStampedModel):
         max_length=20,
         choices=Transaction.PAYMENT_METHODS
     )
-    reference_number = models.CharField(max_length=100, blank=True)
+    # Filled in by PostgreSQL on INSERT and returned to the instance
+    reference_number = models.CharField(
+        max_length=100, blank=True, db_default=AutoReference())
     status = models.CharField(
         max_length=20,
         choices=PAYMENT_STATUS,
@@ -979,64 +1351,80 @@ class Payment(TimeStampedModel):
         ]
 
     def save(self, *args, **kwargs):
-        """Auto-generate reference number if not provided"""
-        if not self.reference_number:
-            import random
-            import string
-            from django.utils import timezone
-            
-            timestamp = timezone.now().strftime('%Y%m%d%H%M%S')
-            random_code = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
-            self.reference_number = f"AUTO-{timestamp}-{random_code}"
-        
+        """Let the column default generate a blank reference number"""
+        if self._state.adding and self.reference_number == '':
+            self.reference_number = self._meta.get_field(
+                'reference_number').get_default()
         super().save(*args, **kwargs)
 
     def process(self, processed_by=None):
         """Process the payment and create receipt"""
+        from django.utils import timezone
+
         if self.status != 'pending':
             raise ValueError(
                 f"Cannot process payment with status {self.status}")
 
-        with transaction.atomic():
-            # Create transaction
-            trans = Transaction.objects.create(
-                account=self.tenant.user.account,
-                transaction_type='payment',
-                amount=self.amount,
-                payment_method=self.payment_method,
-                invoice=self.invoice,
-                reference_number=self.reference_number,
-                description=f"Payment {self.reference_number or 'N/A'}",
-                processed_by=processed_by
-            )
+        # Plain reads stay outside the transaction: one query for the
+        # account id instead of loading tenant, user and account
+        account_id = UserAccount.objects.values_list('pk', flat=True).get(
+            user__tenant_profile__id=self.tenant_id)
 
-            self.transaction = trans
+        with transaction.atomic():
+            # Lock this payment and the invoice row only; concurrent
+            # processing of the same rows runs one at a time
+            locked_status = Payment.objects.select_for_update().values_list(
+                'status', flat=True).get(pk=self.pk)
+            if locked_status != 'pending':
+                raise ValueError(
+                    f"Cannot process payment with status {locked_status}")
 
             # Allocate payment
             amount_to_invoice = Decimal('0.00')
             amount_to_account = Decimal('0.00')
 
-            if self.invoice:
-                # Apply to invoice
-                remaining_invoice = self.invoice.balance_due
+            if self.invoice_id:
+                # Allocate against the locked, current balance
+                total_amount, amount_paid = Invoice.objects.select_for_update(
+                    of=('self',)).values_list(
+                    'total_amount', 'amount_paid').get(pk=self.invoice_id)
+                remaining_invoice = total_amount - amount_paid
                 amount_to_invoice = min(self.amount, remaining_invoice)
                 amount_to_account = self.amount - amount_to_invoice
 
-                self.invoice.amount_paid += amount_to_invoice
-                if self.invoice.amount_paid >= self.invoice.total_amount:
-                    self.invoice.status = 'paid'
-                else:
-                    self.invoice.status = 'partial'
-                self.invoice.save()
+                amount_paid += amount_to_invoice
+                invoice_status = 'paid' if amount_paid >= total_amount else 'partial'
+                Invoice.objects.filter(pk=self.invoice_id).update(
+                    amount_paid=amount_paid, status=invoice_status,
+                    updated_at=timezone.now())
+                # Mirror onto the caller's invoice object
+                self.invoice.total_amount = total_amount
+                self.invoice.amount_paid = amount_paid
+                self.invoice.balance_due = total_amount - amount_paid
+                self.invoice.status = invoice_status
             else:
                 # Credit to account
                 amount_to_account = self.amount
 
+            # Create transaction
+            trans = Transaction.objects.create(
+                account_id=account_id,
+                transaction_type='payment',
+                amount=self.amount,
+                payment_method=self.payment_method,
+                invoice_id=self.invoice_id,
+                reference_number=self.reference_number,
+                description=f"Payment {self.reference_number or 'N/A'}",
+                processed_by=processed_by
+            )
+
+            self.transaction = trans
+
             # Create receipt
             receipt = Receipt.objects.create(
                 transaction=trans,
-                invoice=self.invoice,
-                tenant=self.tenant,
+                invoice_id=self.invoice_id,
+                tenant_id=self.tenant_id,
                 amount=self.amount,
                 payment_date=self.payment_date,
                 payment_method=self.payment_method,
@@ -1048,7 +1436,14 @@ class Payment(TimeStampedModel):
             self.receipt = receipt
             self.status = 'completed'
             self.processed_by = processed_by
-            self.save()
+            # Only these columns change; Payment.save() has nothing to add
+            Payment.objects.filter(pk=self.pk).update(
+                transaction=trans,
+                receipt=receipt,
+                status='completed',
+                processed_by=processed_by,
+                updated_at=timezone.now(),
+            )
 
             return receipt
 
@@ -0,0 +1,181 @@
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.storage import storages
+from django.utils.crypto import salted_hmac
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+
+
+# Styles are plain data, so build them once rather than per receipt
+_STYLES = getSampleStyleSheet()
+
+_TITLE_STYLE = ParagraphStyle(
+    'CustomTitle',
+    parent=_STYLES['Heading1'],
+    fontSize=24,
+    textColor=colors.HexColor('#2C3E50'),
+    spaceAfter=30,
+    alignment=TA_CENTER
+)
+
+_HEADING_STYLE = ParagraphStyle(
+    'CustomHeading',
+    parent=_STYLES['Heading2'],
+    fontSize=14,
+    textColor=colors.HexColor('#34495E'),
+    spaceAfter=12,
+)
+
+_NOTES_STYLE = ParagraphStyle('Notes', parent=_STYLES['Normal'], fontSize=10)
+
+_FOOTER_STYLE = ParagraphStyle(
+    'Footer',
+    parent=_STYLES['Normal'],
+    fontSize=9,
+    textColor=colors.grey,
+    alignment=TA_CENTER
+)
+
+_RECEIPT_TABLE_STYLE = TableStyle([
+    ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+    ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 0), (-1, -1), 11),
+    ('TEXTCOLOR', (0, 0), (0, -1), colors.HexColor('#2C3E50')),
+    ('ALIGN', (0, 0), (0, -1), 'LEFT'),
+    ('ALIGN', (1, 0), (1, -1), 'LEFT'),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+])
+
+_TENANT_TABLE_STYLE = TableStyle([
+    ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+    ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 0), (-1, -1), 10),
+    ('TEXTCOLOR', (0, 0), (0, -1), colors.HexColor('#2C3E50')),
+    ('ALIGN', (0, 0), (0, -1), 'LEFT'),
+    ('ALIGN', (1, 0), (1, -1), 'LEFT'),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+])
+
+_PAYMENT_TABLE_STYLE = TableStyle([
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 11),
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#3498DB')),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (0, -1), 'LEFT'),
+    ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+    ('FONTNAME', (0, 1), (-1, -2), 'Helvetica'),
+    ('FONTSIZE', (0, 1), (-1, -2), 10),
+    ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, -1), (-1, -1), 12),
+    ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#ECF0F1')),
+    ('GRID', (0, 0), (-1, -2), 0.5, colors.grey),
+    ('BOX', (0, -1), (-1, -1), 2, colors.HexColor('#2C3E50')),
+    ('TOPPADDING', (0, 0), (-1, -1), 8),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+])
+
+
+def receipt_storage():
+    """Private storage for rendered receipts; never exposed under /media/"""
+    return storages['private']
+
+
+def receipt_pdf_name(receipt):
+    """Storage path of a receipt's rendered PDF.
+
+    Keyed by an HMAC of the pk so names can't be guessed or enumerated;
+    stable per receipt, so a re-render replaces the old file.
+    """
+    digest = salted_hmac('finance.receipt_pdf', receipt.pk).hexdigest()
+    return f'receipts/{digest}.pdf'
+
+
+def build_receipt_pdf(receipt):
+    """Build a receipt's PDF and return its bytes.
+
+    Reads receipt.tenant.user, tenant.unit.property, invoice and
+    transaction, so select_related them on the way in.
+    """
+    currency = settings.CURRENCY
+
+    # Create PDF in memory
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter, rightMargin=72, leftMargin=72,
+                            topMargin=72, bottomMargin=18)
+
+    # Container for the 'Flowable' objects
+    elements = []
+
+    # Title
+    elements.append(Paragraph("PAYMENT RECEIPT", _TITLE_STYLE))
+    elements.append(Spacer(1, 12))
+
+    # Receipt details
+    receipt_info = [
+        ['Receipt Number:', receipt.receipt_number],
+        ['Payment Date:', receipt.payment_date.strftime('%B %d, %Y')],
+        ['Payment Method:', receipt.get_payment_method_display()],
+    ]
+
+    receipt_table = Table(receipt_info, colWidths=[2*inch, 4*inch])
+    receipt_table.setStyle(_RECEIPT_TABLE_STYLE)
+    elements.append(receipt_table)
+    elements.append(Spacer(1, 20))
+
+    # Tenant information
+    elements.append(Paragraph("Tenant Information", _HEADING_STYLE))
+    tenant_info = [
+        ['Name:', receipt.tenant.user.get_full_name()],
+        ['Email:', receipt.tenant.user.email],
+        ['Unit:', receipt.tenant.unit.unit_number if receipt.tenant.unit else 'N/A'],
+        ['Property:', receipt.tenant.unit.property.name if receipt.tenant.unit else 'N/A'],
+    ]
+
+    tenant_table = Table(tenant_info, colWidths=[2*inch, 4*inch])
+    tenant_table.setStyle(_TENANT_TABLE_STYLE)
+    elements.append(tenant_table)
+    elements.append(Spacer(1, 20))
+
+    # Payment details
+    elements.append(Paragraph("Payment Details", _HEADING_STYLE))
+
+    payment_data = [
+        ['Description', 'Amount'],
+    ]
+
+    if receipt.invoice:
+        payment_data.append(['Invoice #' + receipt.invoice.invoice_number, f'{currency}{receipt.amount_allocated_to_invoice:,.2f}'])
+
+    if receipt.amount_to_account > 0:
+        payment_data.append(['Account Credit', f'{currency}{receipt.amount_to_account:,.2f}'])
+
+    payment_data.append(['', ''])
+    payment_data.append(['Total Amount Paid', f'{currency}{receipt.amount:,.2f}'])
+
+    payment_table = Table(payment_data, colWidths=[4*inch, 2*inch])
+    payment_table.setStyle(_PAYMENT_TABLE_STYLE)
+    elements.append(payment_table)
+    elements.append(Spacer(1, 20))
+
+    # Notes
+    if receipt.notes:
+        elements.append(Paragraph("Notes", _HEADING_STYLE))
+        elements.append(Paragraph(receipt.notes, _NOTES_STYLE))
+        elements.append(Spacer(1, 20))
+
+    # Footer
+    elements.append(Spacer(1, 30))
+    elements.append(Paragraph("Thank you for your payment!", _FOOTER_STYLE))
+    elements.append(Paragraph(f"Transaction ID: {receipt.transaction.transaction_id}", _FOOTER_STYLE))
+
+    # Build PDF
+    doc.build(elements)
+
+    pdf = buffer.getvalue()
+    buffer.close()
+    return pdf
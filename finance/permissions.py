@@ -1,9 +1,26 @@
 from rest_framework import permissions
 
 
+def _request_cache(request, name):
+    """Per-request dict stored on the DRF request"""
+    cache = getattr(request, name, None)
+    if cache is None:
+        cache = {}
+        setattr(request, name, cache)
+    return cache
+
+
 class IsPropertyManagerOrAdmin(permissions.BasePermission):
-    
+
     def has_permission(self, request, view):
+        # DRF checks it again from get_object(); answer once per request
+        cache = _request_cache(request, '_perm_cache')
+        key = type(self)
+        if key not in cache:
+            cache[key] = self._has_permission(request, view)
+        return cache[key]
+
+    def _has_permission(self, request, view):
         if not request.user or not request.user.is_authenticated:
             return False
         
@@ -22,43 +39,55 @@ class IsPropertyManagerOrAdmin(permissions.BasePermission):
         return False
     
     def has_object_permission(self, request, view, obj):
+        cache = _request_cache(request, '_perm_cache')
+        key = (type(self), type(obj), obj.pk)
+        if key not in cache:
+            cache[key] = self._has_object_permission(request, view, obj)
+        return cache[key]
+
+    def _has_object_permission(self, request, view, obj):
         # Admins have full access
         if request.user.role == 'admin':
             return True
-        
+
+        # FK ids are on the row already; getattr doesn't load anything
+        tenant_id = getattr(obj, 'tenant_id', None)
+        account_id = getattr(obj, 'account_id', None)
+
         # Check property manager access
         if request.user.role == 'property_manager':
             # Property manager can access if they manage the property
-            if hasattr(obj, 'tenant'):
-                return self._manages_tenant_property(request.user, obj.tenant)
-            elif hasattr(obj, 'account'):
-                if hasattr(obj.account, 'user'):
-                    if hasattr(obj.account.user, 'tenant_profile'):
-                        return self._manages_tenant_property(
-                            request.user, 
-                            obj.account.user.tenant_profile
-                        )
+            if tenant_id is not None:
+                return tenant_id in _managed_ids(request)[0]
+            if account_id is not None:
+                return account_id in _managed_ids(request)[1]
             return False
-        
+
         # Check tenant access - can only access their own data
         if request.user.role == 'tenant':
-            if hasattr(obj, 'tenant'):
-                return obj.tenant.user == request.user
-            elif hasattr(obj, 'account'):
-                return obj.account.user == request.user
-        
+            if tenant_id is not None:
+                return obj.tenant.user_id == request.user.pk
+            if account_id is not None:
+                return obj.account.user_id == request.user.pk
+
         return False
-    
-    def _manages_tenant_property(self, manager, tenant):
-        """Check if property manager manages the tenant's property"""
-        if not hasattr(tenant, 'property'):
-            return False
-        
-        property_obj = tenant.property
-        if not hasattr(property_obj, 'manager'):
-            return False
-        
-        return property_obj.manager == manager
+
+
+def _managed_ids(request):
+    """(tenant ids, account ids) of the manager's tenants, one query per request"""
+    from tenant.models import Tenant
+
+    ids = getattr(request, '_managed_ids', None)
+    if ids is None:
+        rows = list(Tenant.objects.filter(
+            unit__property__manager=request.user
+        ).values_list('id', 'user__account__id'))
+        ids = (
+            frozenset(tenant_id for tenant_id, _ in rows),
+            frozenset(account_id for _, account_id in rows if account_id),
+        )
+        request._managed_ids = ids
+    return ids
 
 
 class IsTenantOwner(permissions.BasePermission):
@@ -74,18 +103,19 @@ class IsTenantOwner(permissions.BasePermission):
         if request.user.role == 'admin':
             return True
         
+        tenant_id = getattr(obj, 'tenant_id', None)
+
         # Property managers can access their tenants' data
         if request.user.role == 'property_manager':
-            if hasattr(obj, 'tenant'):
-                tenant = obj.tenant
-                if hasattr(tenant, 'property') and hasattr(tenant.property, 'manager'):
-                    return tenant.property.manager == request.user
-        
+            if tenant_id is not None:
+                return tenant_id in _managed_ids(request)[0]
+
         # Tenants can only access their own data
         if request.user.role == 'tenant':
-            if hasattr(obj, 'tenant'):
-                return obj.tenant.user == request.user
-            elif hasattr(obj, 'user'):
-                return obj.user == request.user
+            if tenant_id is not None:
+                return obj.tenant.user_id == request.user.pk
+            user_id = getattr(obj, 'user_id', None)
+            if user_id is not None:
+                return user_id == request.user.pk
         
         return False
\ No newline at end of file
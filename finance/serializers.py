@@ -1,7 +1,10 @@
-from django.db.models import Sum
+from functools import lru_cache
+
+from django.db.models import Count, Prefetch, Sum
 from rest_framework import serializers
 from decimal import Decimal
 from django.db import transaction
+from django.utils import timezone
 from .models import (
     Payment, Receipt, UserAccount, BillingPeriod, ChargeType, Invoice, InvoiceItem,
     Transaction, UtilityCharge, RentPayment
@@ -15,37 +18,55 @@ class DynamicFieldsModelSerializer(serializers.ModelSerializer):
     """
 
     def __init__(self, *args, **kwargs):
-        # Don't apply dynamic fields if this is a nested serializer
-        if not hasattr(self, '_declared_fields') or kwargs.get('context', {}).get('nested'):
-            super().__init__(*args, **kwargs)
-            return
-
         fields = kwargs.pop('fields', None)
         exclude = kwargs.pop('exclude', None)
-
-        # Get fields from request context if available
-        request = self.context.get('request') if hasattr(
-            self, 'context') else None
-        if request:
-            fields = fields or request.query_params.get('fields')
-            exclude = exclude or request.query_params.get('exclude')
+        context = kwargs.get('context') or {}
 
         super().__init__(*args, **kwargs)
 
+        # Don't apply dynamic fields if this is a nested serializer
+        if context.get('nested'):
+            return
+
+        # Get fields from request context if available
+        request = context.get('request')
+        if request is not None:
+            query_fields, query_exclude = _requested_fields(request)
+            fields = fields or query_fields
+            exclude = exclude or query_exclude
+
         if fields:
-            fields = fields.split(',') if isinstance(fields, str) else fields
-            allowed = set(fields)
-            existing = set(self.fields)
-            for field_name in existing - allowed:
+            allowed = _parse_field_list(fields) if isinstance(
+                fields, str) else frozenset(fields)
+            for field_name in [name for name in self.fields if name not in allowed]:
                 self.fields.pop(field_name)
 
         if exclude:
-            exclude = exclude.split(',') if isinstance(
+            exclude = _parse_field_list(exclude) if isinstance(
                 exclude, str) else exclude
             for field_name in exclude:
                 self.fields.pop(field_name, None)
 
 
+@lru_cache(maxsize=1024)
+def _parse_field_list(value):
+    """'a,b,c' -> frozenset; bounded so odd query strings can't grow it"""
+    return frozenset(value.split(','))
+
+
+def _requested_fields(request):
+    """?fields= / ?exclude= lists, parsed once per request"""
+    parsed = getattr(request, '_drf_field_cache', None)
+    if parsed is None:
+        params = request.query_params
+        parsed = tuple(
+            _parse_field_list(params[name]) if params.get(name) else None
+            for name in ('fields', 'exclude')
+        )
+        request._drf_field_cache = parsed
+    return parsed
+
+
 class UserAccountSerializer(DynamicFieldsModelSerializer):
     debt_amount = serializers.ReadOnlyField()
     available_credit = serializers.ReadOnlyField()
@@ -70,27 +91,31 @@ class BillingPeriodDetailSerializer(BillingPeriodSerializer):
     total_billed = serializers.SerializerMethodField()
     total_collected = serializers.SerializerMethodField()
     outstanding_amount = serializers.SerializerMethodField()
-    
+
+    def _aggregates(self, obj):
+        """All four invoice figures from one aggregate query per period"""
+        cache = self.__dict__.setdefault('_agg_cache', {})
+        if obj.pk not in cache:
+            cache[obj.pk] = obj.invoices.aggregate(
+                count=Count('id'),
+                billed=Sum('total_amount'),
+                collected=Sum('amount_paid'),
+                outstanding=Sum('balance_due'),
+            )
+        return cache[obj.pk]
+
     def get_invoices_count(self, obj):
-        return obj.invoices.count()
-    
+        return self._aggregates(obj)['count']
+
     def get_total_billed(self, obj):
-        return obj.invoices.aggregate(
-            total=Sum('total_amount')
-        )['total'] or Decimal('0.00')
-    
+        return self._aggregates(obj)['billed'] or Decimal('0.00')
+
     def get_total_collected(self, obj):
-        return obj.invoices.aggregate(
-            total=Sum('amount_paid')
-        )['total'] or Decimal('0.00')
-    
+        return self._aggregates(obj)['collected'] or Decimal('0.00')
+
     def get_outstanding_amount(self, obj):
-        from django.db.models import F
-        result = obj.invoices.aggregate(
-            total=Sum(F('total_amount') - F('amount_paid'))
-        )['total']
-        return result or Decimal('0.00')
-    
+        return self._aggregates(obj)['outstanding'] or Decimal('0.00')
+
     class Meta(BillingPeriodSerializer.Meta):
         pass
 class ChargeTypeSerializer(DynamicFieldsModelSerializer):
@@ -105,6 +130,8 @@ class InvoiceItemSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = InvoiceItem
         fields = '__all__'
+        # uniq_invoice_chargetype is checked in validate() with a clearer message
+        validators = []
 
     def validate_quantity(self, value):
         if value <= 0:
@@ -112,6 +139,20 @@ class InvoiceItemSerializer(DynamicFieldsModelSerializer):
                 "Quantity must be greater than 0")
         return value
 
+    def validate(self, attrs):
+        invoice = attrs.get('invoice', getattr(self.instance, 'invoice', None))
+        charge_type = attrs.get(
+            'charge_type', getattr(self.instance, 'charge_type', None))
+        if invoice is not None and charge_type is not None:
+            clashes = InvoiceItem.objects.filter(
+                invoice=invoice, charge_type=charge_type)
+            if self.instance is not None:
+                clashes = clashes.exclude(pk=self.instance.pk)
+            if clashes.exists():
+                raise serializers.ValidationError(
+                    {'charge_type': 'Invoice already has an item for this charge type'})
+        return attrs
+
 
 class InvoiceSerializer(DynamicFieldsModelSerializer):
     invoice_number = serializers.ReadOnlyField()
@@ -166,11 +207,13 @@ class RentPaymentSerializer(serializers.ModelSerializer):
 # Nested serializers for complex operations
 class InvoiceItemCreateSerializer(serializers.ModelSerializer):
     """Simplified serializer for creating invoice items within invoice"""
+    # Writable so invoice updates can match items they keep
+    id = serializers.IntegerField(required=False)
     line_total = serializers.ReadOnlyField()
 
     class Meta:
         model = InvoiceItem
-        fields = ['charge_type', 'description',
+        fields = ['id', 'charge_type', 'description',
                   'quantity', 'unit_price', 'line_total']
 
     def validate_quantity(self, value):
@@ -179,6 +222,10 @@ class InvoiceItemCreateSerializer(serializers.ModelSerializer):
                 "Quantity must be greater than 0")
         return value
 
+    def create(self, validated_data):
+        validated_data.pop('id', None)
+        return super().create(validated_data)
+
 
 class InvoiceWithItemsSerializer(InvoiceSerializer):
     """Invoice serializer with nested items for creation"""
@@ -187,19 +234,31 @@ class InvoiceWithItemsSerializer(InvoiceSerializer):
     class Meta(InvoiceSerializer.Meta):
         pass
 
+    def validate_items(self, value):
+        charge_types = [item['charge_type'].pk for item in value]
+        if len(charge_types) != len(set(charge_types)):
+            raise serializers.ValidationError(
+                "Each charge type can appear only once per invoice")
+        return value
+
     def create(self, validated_data):
         items_data = validated_data.pop('items', [])
         with transaction.atomic():
             invoice = Invoice.objects.create(**validated_data)
 
+            # One multi-row INSERT; InvoiceItem.save() has no side effects
             for item_data in items_data:
-                InvoiceItem.objects.create(invoice=invoice, **item_data)
+                item_data.pop('id', None)
+            InvoiceItem.objects.bulk_create(
+                [InvoiceItem(invoice=invoice, **item_data)
+                 for item_data in items_data],
+                batch_size=500)
 
             # Ensure rent item exists after provided items
             invoice.ensure_rent_item()
 
-            # Recalculate totals
-            self._calculate_totals(invoice)
+            # Recalculate totals (SUM in the database)
+            invoice.recalculate_totals()
             return invoice
 
     def update(self, instance, validated_data):
@@ -209,30 +268,53 @@ class InvoiceWithItemsSerializer(InvoiceSerializer):
             # Update invoice fields
             for attr, value in validated_data.items():
                 setattr(instance, attr, value)
+            if items_data is None and 'tax_amount' in validated_data:
+                # Items unchanged, so the stored subtotal is still right
+                instance.total_amount = instance.subtotal + instance.tax_amount
             instance.save()
 
             # Handle items if provided
             if items_data is not None:
-                # Delete existing items and create new ones
-                instance.items.all().delete()
-                for item_data in items_data:
-                    InvoiceItem.objects.create(invoice=instance, **item_data)
+                self._sync_items(instance, items_data)
 
                 # Ensure rent item exists after replacements
                 instance.ensure_rent_item()
 
-                # Recalculate totals
-                self._calculate_totals(instance)
+                # Recalculate totals (SUM in the database)
+                instance.recalculate_totals()
 
             return instance
 
-    def _calculate_totals(self, invoice):
-        """Calculate invoice totals from items"""
-        items = invoice.items.all()
-        subtotal = sum(item.line_total for item in items)
-        invoice.subtotal = subtotal
-        invoice.total_amount = subtotal + invoice.tax_amount
-        invoice.save(update_fields=['subtotal', 'total_amount'])
+    def _sync_items(self, invoice, items_data):
+        """Make invoice.items match items_data in at most four statements.
+
+        Items sent with an id are updated in place, ones without are
+        inserted and any not sent are deleted.
+        """
+        incoming_ids = {item['id'] for item in items_data if 'id' in item}
+        invoice.items.exclude(id__in=incoming_ids).delete()
+        existing = invoice.items.in_bulk(incoming_ids)
+
+        now = timezone.now()
+        to_update, to_create = [], []
+        for item_data in items_data:
+            item = existing.get(item_data.pop('id', None))
+            if item is None:
+                to_create.append(InvoiceItem(invoice=invoice, **item_data))
+                continue
+            for attr, value in item_data.items():
+                setattr(item, attr, value)
+            # bulk_update doesn't apply auto_now
+            item.updated_at = now
+            to_update.append(item)
+
+        if to_update:
+            InvoiceItem.objects.bulk_update(
+                to_update,
+                ['charge_type', 'description', 'quantity', 'unit_price',
+                 'updated_at'],
+                batch_size=500)
+        InvoiceItem.objects.bulk_create(to_create, batch_size=500)
 
 
 
@@ -261,9 +343,7 @@ class BulkUtilityChargeSerializer(serializers.Serializer):
     billing_period_id = serializers.IntegerField()
 
     def validate_billing_period_id(self, value):
-        try:
-            BillingPeriod.objects.get(id=value)
-        except BillingPeriod.DoesNotExist:
+        if not BillingPeriod.objects.filter(id=value).exists():
             raise serializers.ValidationError("Invalid billing period")
         return value
 
@@ -271,12 +351,14 @@ class BulkUtilityChargeSerializer(serializers.Serializer):
         charges_data = validated_data['utility_charges']
         billing_period_id = validated_data['billing_period_id']
 
-        charges = []
-        with transaction.atomic():
-            for charge_data in charges_data:
-                charge_data['billing_period_id'] = billing_period_id
-                charge = UtilityCharge.objects.create(**charge_data)
-                charges.append(charge)
+        # The shared period wins over any per-charge one
+        for charge_data in charges_data:
+            charge_data.pop('billing_period', None)
+        # bulk_create runs in its own transaction
+        charges = UtilityCharge.objects.bulk_create(
+            [UtilityCharge(**charge_data, billing_period_id=billing_period_id)
+             for charge_data in charges_data],
+            batch_size=500)
 
         return {'utility_charges': charges}
 
@@ -306,6 +388,14 @@ class MonthlyBillingSummarySerializer(serializers.Serializer):
 
 
 # Minimal serializers for list views
+
+# Columns tenant.user.get_full_name() reads
+_TENANT_NAME_FIELDS = (
+    'tenant__user__first_name', 'tenant__user__last_name',
+    'tenant__user__username',
+)
+
+
 class InvoiceListSerializer(serializers.ModelSerializer):
     """Minimal invoice serializer for list views - no dynamic fields"""
     tenant_name = serializers.CharField(
@@ -321,6 +411,18 @@ class InvoiceListSerializer(serializers.ModelSerializer):
             'balance_due', 'is_overdue'
         ]
 
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        # Narrow SELECT; select_related(None) drops joins the default
+        # manager adds, which only() would otherwise reject as deferred
+        return (
+            queryset.select_related(None).prefetch_related(None)
+            .select_related('tenant__user')
+            .only('id', 'invoice_number', 'issue_date', 'due_date', 'status',
+                  'total_amount', 'amount_paid', 'balance_due',
+                  *_TENANT_NAME_FIELDS)
+        )
+
 
 class TransactionListSerializer(serializers.ModelSerializer):
     """Minimal transaction serializer for list views - no dynamic fields"""
@@ -331,6 +433,10 @@ class TransactionListSerializer(serializers.ModelSerializer):
             'payment_method', 'created_at', 'description'
         ]
 
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        return queryset.select_related(None).only(*cls.Meta.fields)
+
 
 class RentPaymentListSerializer(serializers.ModelSerializer):
     """Minimal rent payment serializer for list views - no dynamic fields"""
@@ -346,6 +452,15 @@ class RentPaymentListSerializer(serializers.ModelSerializer):
             'payment_date', 'due_date', 'status', 'is_overdue'
         ]
 
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        return (
+            queryset.select_related(None)
+            .select_related('tenant__user', 'billing_period')
+            .only('id', 'amount', 'payment_date', 'due_date', 'status',
+                  'billing_period__name', *_TENANT_NAME_FIELDS)
+        )
+
 
 class ReceiptSerializer(DynamicFieldsModelSerializer):
     """Serializer for receipts"""
@@ -360,6 +475,10 @@ class ReceiptSerializer(DynamicFieldsModelSerializer):
         fields = '__all__'
         read_only_fields = ('receipt_number', 'transaction', 'issued_by')
 
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        return queryset.select_related('tenant__user')
+
 
 class PaymentSerializer(serializers.ModelSerializer):
     """Serializer for general payments"""
@@ -380,6 +499,17 @@ class InvoiceDetailSerializer(InvoiceSerializer):
 
     class Meta(InvoiceSerializer.Meta):
         pass
+
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        receipts = Receipt.objects.select_related('tenant__user')
+        return queryset.prefetch_related(
+            'items',
+            Prefetch('payments', queryset=Payment.objects.select_related(
+                'receipt__tenant__user')),
+            Prefetch('receipts', queryset=receipts),
+            'transactions',
+        )
     
 class ProcessPaymentSerializer(serializers.Serializer):
     """Serializer for processing payments"""
@@ -419,14 +549,14 @@ class GenerateInvoiceSerializer(serializers.Serializer):
     )
 
     def validate_billing_period_id(self, value):
-        try:
-            period = BillingPeriod.objects.get(id=value)
-            if period.is_closed:
-                raise serializers.ValidationError(
-                    "Cannot generate invoices for closed billing period"
-                )
-        except BillingPeriod.DoesNotExist:
+        is_closed = BillingPeriod.objects.filter(id=value).values_list(
+            'is_closed', flat=True).first()
+        if is_closed is None:
             raise serializers.ValidationError("Invalid billing period")
+        if is_closed:
+            raise serializers.ValidationError(
+                "Cannot generate invoices for closed billing period"
+            )
         return value
 
 
@@ -450,18 +580,16 @@ class AllocatePaymentSerializer(serializers.Serializer):
     )
 
     def validate(self, attrs):
-        try:
-            payment = Payment.objects.get(id=attrs['payment_id'])
-            if payment.status != 'completed':
-                raise serializers.ValidationError(
-                    "Can only allocate completed payments"
-                )
-        except Payment.DoesNotExist:
+        payment_status = Payment.objects.filter(
+            id=attrs['payment_id']).values_list('status', flat=True).first()
+        if payment_status is None:
             raise serializers.ValidationError("Invalid payment ID")
+        if payment_status != 'completed':
+            raise serializers.ValidationError(
+                "Can only allocate completed payments"
+            )
 
-        try:
-            Invoice.objects.get(id=attrs['invoice_id'])
-        except Invoice.DoesNotExist:
+        if not Invoice.objects.filter(id=attrs['invoice_id']).exists():
             raise serializers.ValidationError("Invalid invoice ID")
 
         return attrs
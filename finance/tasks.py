@@ -0,0 +1,32 @@
+from celery import shared_task
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+
+from .models import BillingPeriod, Receipt
+from .pdf import build_receipt_pdf, receipt_pdf_name, receipt_storage
+
+
+@shared_task
+def generate_invoices(billing_period_id, tenant_ids=None, auto_send=False,
+                      created_by_id=None):
+    """Generate a billing period's invoices outside the request cycle"""
+    period = BillingPeriod.objects.get(pk=billing_period_id)
+    created_by = get_user_model().objects.filter(pk=created_by_id).first()
+    invoices, errors = period.generate_invoices(
+        tenant_ids, auto_send, created_by=created_by)
+    return {'invoices_created': len(invoices), 'errors': errors}
+
+
+@shared_task
+def render_receipt_pdf(receipt_id):
+    """Render a receipt's PDF into private storage; returns the file name"""
+    receipt = Receipt.objects.select_related(
+        'tenant__user', 'tenant__unit__property', 'invoice', 'transaction'
+    ).get(pk=receipt_id)
+
+    # Re-rendering replaces the old file instead of saving under a new name
+    storage = receipt_storage()
+    name = receipt_pdf_name(receipt)
+    if storage.exists(name):
+        storage.delete(name)
+    return storage.save(name, ContentFile(build_receipt_pdf(receipt)))
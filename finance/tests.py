@@ -1,3 +1,392 @@
-from django.test import TestCase
+from datetime import date
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from management.models import Office
+from property.models import Property, Unit
+from tenant.models import Tenant
+from .models import (
+    BillingPeriod, ChargeType, Invoice, InvoiceItem, Payment, Receipt,
+    RentPayment, UserAccount, UtilityCharge, UtilityType,
+)
+
+User = get_user_model()
+
+
+class FinanceTestCase(APITestCase):
+    """An admin, one unit, one active tenant and an open billing period."""
+
+    def setUp(self):
+        # Charge types and the current period are cached by pk; a previous
+        # test's rows are gone after its rollback
+        cache.clear()
+
+        self.admin_user = User.objects.create_superuser(
+            email='admin@example.com',
+            username='admin',
+            password='Password123!'
+        )
+        self.client.force_authenticate(user=self.admin_user)
+
+        self.office = Office.objects.create(
+            name="Main Office",
+            manager=self.admin_user
+        )
+        self.property = Property.objects.create(
+            name="Test Property",
+            address="123 Test St",
+            office=self.office
+        )
+        self.unit = Unit.objects.create(
+            property=self.property,
+            name="Unit 101",
+            abbreviated_name="U101",
+            unit_number="U101",
+            monthly_rent=Decimal('1000.00'),
+            deposit_amount=Decimal('1000.00')
+        )
+        self.tenant = self.create_tenant('tenant')
+        self.period = BillingPeriod.objects.create(
+            name="March 2026",
+            start_date=date(2026, 3, 1),
+            end_date=date(2026, 3, 31),
+            due_date=date(2026, 4, 5)
+        )
+
+    def create_tenant(self, username, tenant_status=Tenant.TenantStatus.ACTIVE):
+        user = User.objects.create_tenant(
+            email=f'{username}@example.com',
+            username=username,
+            password='Password123!',
+            created_by=self.admin_user
+        )
+        return Tenant.objects.create(
+            user=user,
+            unit=self.unit,
+            status=tenant_status,
+            lease_start_date=date(2026, 1, 1)
+        )
+
+    def create_invoice(self, total=Decimal('1000.00'), invoice_status='draft', tenant=None):
+        return Invoice.objects.create(
+            tenant=tenant or self.tenant,
+            billing_period=self.period,
+            due_date=self.period.due_date,
+            status=invoice_status,
+            subtotal=total,
+            total_amount=total
+        )
+
+
+class PaymentProcessingTests(FinanceTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.invoice = self.create_invoice()
+
+    def test_payment_processed_twice_is_rejected(self):
+        payment = Payment.objects.create(
+            tenant=self.tenant,
+            invoice=self.invoice,
+            amount=Decimal('400.00'),
+            payment_method='cash'
+        )
+        url = reverse('payment-process', args=[payment.pk])
+
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('error', response.data)
+
+        self.invoice.refresh_from_db()
+        self.assertEqual(self.invoice.amount_paid, Decimal('400.00'))
+        self.assertEqual(self.invoice.status, 'partial')
+        self.assertEqual(Receipt.objects.filter(invoice=self.invoice).count(), 1)
+        account = UserAccount.objects.get(user=self.tenant.user)
+        self.assertEqual(account.balance, Decimal('400.00'))
+
+    def test_stale_payment_instance_is_rejected_under_lock(self):
+        payment = Payment.objects.create(
+            tenant=self.tenant,
+            invoice=self.invoice,
+            amount=Decimal('1000.00'),
+            payment_method='cash'
+        )
+        # Loaded while still pending, as a concurrent request would have it
+        stale = Payment.objects.get(pk=payment.pk)
+
+        payment.process(processed_by=self.admin_user)
+        with self.assertRaises(ValueError):
+            stale.process(processed_by=self.admin_user)
+
+        self.invoice.refresh_from_db()
+        self.assertEqual(self.invoice.amount_paid, Decimal('1000.00'))
+        self.assertEqual(self.invoice.status, 'paid')
+        self.assertEqual(Receipt.objects.filter(invoice=self.invoice).count(), 1)
+
+    def test_stale_rent_payment_instance_is_rejected_under_lock(self):
+        rent_payment = RentPayment.objects.create(
+            tenant=self.tenant,
+            billing_period=self.period,
+            invoice=self.invoice,
+            amount=Decimal('1000.00'),
+            due_date=self.period.due_date,
+            payment_method='cash'
+        )
+        stale = RentPayment.objects.get(pk=rent_payment.pk)
+
+        rent_payment.process_payment(processed_by=self.admin_user)
+        with self.assertRaises(ValueError):
+            stale.process_payment(processed_by=self.admin_user)
+
+        self.invoice.refresh_from_db()
+        self.assertEqual(self.invoice.amount_paid, Decimal('1000.00'))
+        account = UserAccount.objects.get(user=self.tenant.user)
+        self.assertEqual(account.balance, Decimal('1000.00'))
+
+
+class DuplicateChargeTypeTests(FinanceTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.invoice = self.create_invoice(Decimal('0.00'))
+        self.water = ChargeType.objects.create(
+            name="Water Bill", frequency='recurring', is_system_charge=True)
+        InvoiceItem.objects.create(
+            invoice=self.invoice,
+            charge_type=self.water,
+            description="Water",
+            unit_price=Decimal('50.00')
+        )
+
+    def test_duplicate_item_through_api_is_a_validation_error(self):
+        response = self.client.post(reverse('invoiceitem-list'), {
+            'invoice': self.invoice.pk,
+            'charge_type': self.water.pk,
+            'description': "Water again",
+            'quantity': '1.00',
+            'unit_price': '60.00',
+        }, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('charge_type', response.data)
+        self.assertEqual(InvoiceItem.objects.filter(invoice=self.invoice).count(), 1)
+
+    def test_add_to_invoice_leaves_duplicate_charge_unbilled(self):
+        charge = UtilityCharge.objects.create(
+            tenant=self.tenant,
+            utility_type=UtilityType.WATER,
+            billing_period=self.period,
+            amount=Decimal('60.00')
+        )
+
+        with self.assertRaises(ValueError):
+            charge.add_to_invoice(self.invoice)
+
+        charge.refresh_from_db()
+        self.assertFalse(charge.is_billed)
+
+    def test_bulk_add_only_bills_charges_that_got_an_item(self):
+        water = UtilityCharge.objects.create(
+            tenant=self.tenant,
+            utility_type=UtilityType.WATER,
+            billing_period=self.period,
+            amount=Decimal('60.00')
+        )
+        gas = UtilityCharge.objects.create(
+            tenant=self.tenant,
+            utility_type=UtilityType.GAS,
+            billing_period=self.period,
+            amount=Decimal('30.00')
+        )
+
+        items, skipped = UtilityCharge.bulk_add_to_invoices(
+            UtilityCharge.objects.filter(pk__in=[water.pk, gas.pk]),
+            {self.tenant.pk: self.invoice}
+        )
+
+        self.assertEqual(len(items), 1)
+        self.assertEqual([charge.pk for charge in skipped], [water.pk])
+        water.refresh_from_db()
+        gas.refresh_from_db()
+        self.assertFalse(water.is_billed)
+        self.assertTrue(gas.is_billed)
+        self.assertEqual(
+            InvoiceItem.objects.get(invoice=self.invoice, charge_type=self.water).unit_price,
+            Decimal('50.00')
+        )
+
+
+class InvoiceTransitionTests(FinanceTestCase):
+    ALL_STATUSES = ['draft', 'sent', 'paid', 'partial', 'overdue', 'cancelled']
+
+    def assert_transition(self, action, allowed, to_status):
+        for from_status in self.ALL_STATUSES:
+            with self.subTest(action=action, from_status=from_status):
+                invoice = self.create_invoice(invoice_status=from_status)
+                before = invoice.updated_at
+
+                response = self.client.post(
+                    reverse(f'invoice-{action}', args=[invoice.pk]))
+
+                invoice.refresh_from_db()
+                if from_status in allowed:
+                    self.assertEqual(response.status_code, status.HTTP_200_OK)
+                    self.assertEqual(invoice.status, to_status)
+                    self.assertGreater(invoice.updated_at, before)
+                else:
+                    self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+                    self.assertIn('error', response.data)
+                    self.assertEqual(invoice.status, from_status)
+
+    def test_send_only_from_draft(self):
+        self.assert_transition('send', ['draft'], 'sent')
+
+    def test_cancel_only_from_draft_or_sent(self):
+        self.assert_transition('cancel', ['draft', 'sent'], 'cancelled')
+
+    def test_missing_invoice_is_not_found(self):
+        for action in ('send', 'cancel'):
+            with self.subTest(action=action):
+                response = self.client.post(reverse(f'invoice-{action}', args=[0]))
+                self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_invoice_outside_managers_properties_is_not_found(self):
+        manager = User.objects.create_user(
+            email='manager@example.com',
+            username='manager',
+            password='Password123!',
+            role='property_manager'
+        )
+        self.client.force_authenticate(user=manager)
+
+        for action in ('send', 'cancel'):
+            with self.subTest(action=action):
+                # A status it couldn't leave anyway must still be a 404, not a 400
+                invoice = self.create_invoice(invoice_status='paid')
+                response = self.client.post(reverse(f'invoice-{action}', args=[invoice.pk]))
+                self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+                invoice = self.create_invoice()
+                response = self.client.post(reverse(f'invoice-{action}', args=[invoice.pk]))
+                self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+                invoice.refresh_from_db()
+                self.assertEqual(invoice.status, 'draft')
+
+
+@override_settings(CELERY_TASK_ALWAYS_EAGER=True)
+class GenerateInvoicesTests(FinanceTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.pending_tenant = self.create_tenant(
+            'pending', tenant_status=Tenant.TenantStatus.PENDING)
+        self.water = UtilityCharge.objects.create(
+            tenant=self.tenant,
+            utility_type=UtilityType.WATER,
+            billing_period=self.period,
+            amount=Decimal('60.00')
+        )
+        self.url = reverse('billingperiod-generate-invoices', args=[self.period.pk])
+
+    def test_generates_draft_invoices_for_active_tenants(self):
+        response = self.client.post(self.url, {}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['invoices_created'], 1)
+        self.assertEqual(response.data['errors'], [])
+        self.assertIn(f'billing_period={self.period.pk}', response.data['list_url'])
+
+        invoice = Invoice.objects.get(billing_period=self.period)
+        self.assertEqual(invoice.tenant, self.tenant)
+        self.assertEqual(invoice.status, 'draft')
+        self.assertEqual(invoice.created_by, self.admin_user)
+        self.assertEqual(invoice.total_amount, Decimal('1060.00'))
+        self.assertEqual(
+            sorted(invoice.items.values_list('charge_type__name', flat=True)),
+            ['Monthly Rent', 'Water Bill']
+        )
+        self.water.refresh_from_db()
+        self.assertTrue(self.water.is_billed)
+        self.assertFalse(
+            Invoice.objects.filter(tenant=self.pending_tenant).exists())
+
+    def test_auto_send_marks_invoices_sent(self):
+        response = self.client.post(self.url, {'auto_send': True}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['invoices_created'], 1)
+        invoice = Invoice.objects.get(billing_period=self.period)
+        self.assertEqual(invoice.status, 'sent')
+
+    def test_second_run_keeps_existing_invoices_and_sends_drafts(self):
+        self.client.post(self.url, {}, format='json')
+        draft = Invoice.objects.get(billing_period=self.period)
+
+        response = self.client.post(self.url, {'auto_send': True}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        invoice = Invoice.objects.get(billing_period=self.period)
+        self.assertEqual(invoice.pk, draft.pk)
+        self.assertEqual(invoice.status, 'sent')
+        self.assertGreater(invoice.updated_at, draft.updated_at)
+        self.assertEqual(invoice.items.count(), 2)
+        self.assertEqual(invoice.total_amount, Decimal('1060.00'))
+
+    def test_closed_period_is_rejected(self):
+        self.period.close_period(self.admin_user)
+
+        response = self.client.post(self.url, {}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Invoice.objects.filter(billing_period=self.period).exists())
+
+
+class InvoiceCursorPaginationTests(FinanceTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.invoices = [self.create_invoice() for _ in range(3)]
+        self.url = reverse('invoice-list')
+
+    def test_pages_newest_first_by_id(self):
+        response = self.client.get(self.url, {'page_size': 2})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data), {'next', 'previous', 'results'})
+        self.assertIsNone(response.data['previous'])
+        self.assertIsNotNone(response.data['next'])
+        self.assertEqual(
+            [row['id'] for row in response.data['results']],
+            [self.invoices[2].pk, self.invoices[1].pk]
+        )
+        self.assertEqual(set(response.data['results'][0]), {
+            'id', 'invoice_number', 'tenant_name', 'issue_date', 'due_date',
+            'status', 'total_amount', 'amount_paid', 'balance_due', 'is_overdue',
+        })
+
+        response = self.client.get(response.data['next'])
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNone(response.data['next'])
+        self.assertIsNotNone(response.data['previous'])
+        self.assertEqual(
+            [row['id'] for row in response.data['results']],
+            [self.invoices[0].pk]
+        )
+
+    def test_non_unique_ordering_is_ignored(self):
+        response = self.client.get(self.url, {'ordering': 'due_date'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [row['id'] for row in response.data['results']],
+            [invoice.pk for invoice in reversed(self.invoices)]
+        )
@@ -1,16 +1,24 @@
+import logging
+
 from rest_framework import viewsets, status, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 from django_filters.rest_framework import DjangoFilterBackend
 from django.db.models import Q, Sum, Count
-from datetime import date
+from datetime import date, datetime
 from decimal import Decimal
-from django.db import transaction as db_transaction
+from django.db import IntegrityError, transaction as db_transaction
+from django.conf import settings
+from django.http import Http404
+from django.urls import reverse
+from django.utils import timezone
 from django.db.models import Sum, F
 
 from finance.permissions import IsPropertyManagerOrAdmin
+from utils.today import today as current_date
 
 from .models import (
     Payment, Receipt, UserAccount, BillingPeriod, ChargeType, Invoice, InvoiceItem,
@@ -26,6 +34,8 @@ from .serializers import (
 )
 from drf_spectacular.utils import extend_schema
 
+logger = logging.getLogger(__name__)
+
 
 class StandardResultsPagination(PageNumberPagination):
     page_size = 20
@@ -33,6 +43,19 @@ class StandardResultsPagination(PageNumberPagination):
     max_page_size = 100
 
 
+class NewestFirstCursorPagination(CursorPagination):
+    """Keyset pages: deep pages cost the same as the first.
+
+    The cursor seeks on the first ordering column only, so it must be
+    (near) unique: newest first by primary key. Viewsets using it should
+    only offer near-unique ordering_fields such as created_at.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = '-id'
+
+
 class BaseViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated, IsPropertyManagerOrAdmin]
     pagination_class = StandardResultsPagination
@@ -42,6 +65,10 @@ class BaseViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         """Filter queryset based on user role"""
         queryset = super().get_queryset()
+        # Serializers that follow relations say which ones to load up front
+        serializer_class = self.get_serializer_class()
+        if hasattr(serializer_class, 'setup_eager_loading'):
+            queryset = serializer_class.setup_eager_loading(queryset)
         user = self.request.user
 
         # Admins see everything
@@ -80,28 +107,31 @@ class UserAccountViewSet(BaseViewSet):
         """Get account summary with statistics"""
         account = self.get_object()
 
-        # Get related data
-        invoices = Invoice.objects.filter(tenant__user__account=account)
-        transactions = Transaction.objects.filter(account=account)
+        today = current_date()
+
+        # Both invoice counts in one conditional aggregate
+        invoice_counts = Invoice.objects.filter(
+            tenant__user__account=account
+        ).aggregate(
+            total=Count('id'),
+            overdue=Count('id', filter=Q(
+                due_date__lt=today, status__in=['sent', 'partial'])),
+        )
+        last_payment_at = Transaction.objects.filter(
+            account=account, transaction_type='payment'
+        ).order_by('-created_at').values_list('created_at', flat=True).first()
 
         summary_data = {
             'balance': account.balance,
             'debt_amount': account.debt_amount,
             'available_credit': account.available_credit,
-            'total_invoices': invoices.count(),
-            'overdue_invoices': invoices.filter(
-                due_date__lt=date.today(),
-                status__in=['sent', 'partial']
-            ).count(),
+            'total_invoices': invoice_counts['total'],
+            'overdue_invoices': invoice_counts['overdue'],
             'pending_payments': RentPayment.objects.filter(
                 tenant__user__account=account,
                 status='pending'
             ).count(),
-            'last_payment_date': transactions.filter(
-                transaction_type='payment'
-            ).order_by('-created_at').first().created_at.date() if transactions.filter(
-                transaction_type='payment'
-            ).exists() else None
+            'last_payment_date': last_payment_at.date() if last_payment_at else None
         }
 
         serializer = AccountSummarySerializer(summary_data)
@@ -111,21 +141,19 @@ class UserAccountViewSet(BaseViewSet):
 @extend_schema(tags=["Receipts"])
 class ReceiptViewSet(BaseViewSet):
     queryset = Receipt.objects.select_related(
-        'tenant', 'invoice', 'transaction')
+        'tenant__user', 'invoice', 'transaction')
     serializer_class = ReceiptSerializer
     filterset_fields = ['tenant', 'invoice', 'payment_method']
     search_fields = ['receipt_number',
                      'tenant__user__first_name', 'tenant__user__last_name']
-    ordering_fields = ['payment_date', 'amount', 'created_at']
-    ordering = ['-payment_date']
+    # Cursor pagination keys on the ordering column, so only near-unique ones
+    ordering_fields = ['id', 'created_at']
+    ordering = ['-id']
+    pagination_class = NewestFirstCursorPagination
 
     def filter_for_property_manager(self, queryset, user):
         """Filter receipts for property manager's tenants"""
-        from tenant.models import Tenant
-        managed_tenant_ids = Tenant.objects.filter(
-            unit__property__manager=user
-        ).values_list('id', flat=True)
-        return queryset.filter(tenant_id__in=managed_tenant_ids)
+        return queryset.filter(tenant__unit__property__manager=user)
 
     def filter_for_tenant(self, queryset, user):
         """Filter receipts for specific tenant"""
@@ -135,171 +163,49 @@ class ReceiptViewSet(BaseViewSet):
         except:
             return queryset.none()
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'download':
+            # The PDF prints the tenant's unit and property too
+            queryset = queryset.select_related('tenant__unit__property')
+        return queryset
+
     @action(detail=True, methods=['get'])
     def download(self, request, pk=None):
-        """Generate and download PDF receipt"""
-        import logging
+        """Generate and download PDF receipt.
+
+        With a Celery broker the PDF is rendered by a worker instead: the
+        response is a 202 with a task id to poll on download_status.
+        """
         from django.http import HttpResponse
-        from reportlab.lib import colors
-        from reportlab.lib.pagesizes import letter, A4
-        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-        from reportlab.lib.units import inch
-        from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-        from reportlab.lib.enums import TA_CENTER, TA_RIGHT, TA_LEFT
-        from io import BytesIO
-        from a_core.settings import CURRENCY
-        
-        logger = logging.getLogger(__name__)
-        
+        from .pdf import build_receipt_pdf
+
+        receipt = self.get_object()
+
+        if not settings.CELERY_TASK_ALWAYS_EAGER:
+            from .tasks import render_receipt_pdf
+            task = render_receipt_pdf.delay(receipt.id)
+            poll_url = self.reverse_action(
+                'download-status', args=[receipt.pk])
+            return Response(
+                {'task_id': task.id,
+                 'poll_url': f'{poll_url}?task_id={task.id}'},
+                status=status.HTTP_202_ACCEPTED
+            )
+
         try:
-            receipt = self.get_object()
             logger.info(f"Generating PDF for receipt {receipt.receipt_number}")
-            
-            # Create PDF in memory
-            buffer = BytesIO()
-            doc = SimpleDocTemplate(buffer, pagesize=letter, rightMargin=72, leftMargin=72,
-                                    topMargin=72, bottomMargin=18)
-            
-            # Container for the 'Flowable' objects
-            elements = []
-            
-            # Define styles
-            styles = getSampleStyleSheet()
-            title_style = ParagraphStyle(
-                'CustomTitle',
-                parent=styles['Heading1'],
-                fontSize=24,
-                textColor=colors.HexColor('#2C3E50'),
-                spaceAfter=30,
-                alignment=TA_CENTER
-            )
-            
-            heading_style = ParagraphStyle(
-                'CustomHeading',
-                parent=styles['Heading2'],
-                fontSize=14,
-                textColor=colors.HexColor('#34495E'),
-                spaceAfter=12,
-            )
-            
-            # Title
-            elements.append(Paragraph("PAYMENT RECEIPT", title_style))
-            elements.append(Spacer(1, 12))
-            
-            # Receipt details
-            receipt_info = [
-                ['Receipt Number:', receipt.receipt_number],
-                ['Payment Date:', receipt.payment_date.strftime('%B %d, %Y')],
-                ['Payment Method:', receipt.get_payment_method_display()],
-            ]
-            
-            receipt_table = Table(receipt_info, colWidths=[2*inch, 4*inch])
-            receipt_table.setStyle(TableStyle([
-                ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-                ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
-                ('FONTSIZE', (0, 0), (-1, -1), 11),
-                ('TEXTCOLOR', (0, 0), (0, -1), colors.HexColor('#2C3E50')),
-                ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-                ('ALIGN', (1, 0), (1, -1), 'LEFT'),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-            ]))
-            elements.append(receipt_table)
-            elements.append(Spacer(1, 20))
-            
-            # Tenant information
-            elements.append(Paragraph("Tenant Information", heading_style))
-            tenant_info = [
-                ['Name:', receipt.tenant.user.get_full_name()],
-                ['Email:', receipt.tenant.user.email],
-                ['Unit:', receipt.tenant.unit.unit_number if receipt.tenant.unit else 'N/A'],
-                ['Property:', receipt.tenant.unit.property.name if receipt.tenant.unit else 'N/A'],
-            ]
-            
-            tenant_table = Table(tenant_info, colWidths=[2*inch, 4*inch])
-            tenant_table.setStyle(TableStyle([
-                ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-                ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
-                ('FONTSIZE', (0, 0), (-1, -1), 10),
-                ('TEXTCOLOR', (0, 0), (0, -1), colors.HexColor('#2C3E50')),
-                ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-                ('ALIGN', (1, 0), (1, -1), 'LEFT'),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-            ]))
-            elements.append(tenant_table)
-            elements.append(Spacer(1, 20))
-            
-            # Payment details
-            elements.append(Paragraph("Payment Details", heading_style))
-            
-            payment_data = [
-                ['Description', 'Amount'],
-            ]
-            
-            if receipt.invoice:
-                payment_data.append(['Invoice #' + receipt.invoice.invoice_number, f'{CURRENCY}{receipt.amount_allocated_to_invoice:,.2f}'])
-            
-            if receipt.amount_to_account > 0:
-                payment_data.append(['Account Credit', f'{CURRENCY}{receipt.amount_to_account:,.2f}'])
-            
-            payment_data.append(['', ''])
-            payment_data.append(['Total Amount Paid', f'{CURRENCY}{receipt.amount:,.2f}'])
-            
-            payment_table = Table(payment_data, colWidths=[4*inch, 2*inch])
-            payment_table.setStyle(TableStyle([
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 11),
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#3498DB')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-                ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-                ('FONTNAME', (0, 1), (-1, -2), 'Helvetica'),
-                ('FONTSIZE', (0, 1), (-1, -2), 10),
-                ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, -1), (-1, -1), 12),
-                ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#ECF0F1')),
-                ('GRID', (0, 0), (-1, -2), 0.5, colors.grey),
-                ('BOX', (0, -1), (-1, -1), 2, colors.HexColor('#2C3E50')),
-                ('TOPPADDING', (0, 0), (-1, -1), 8),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-            ]))
-            elements.append(payment_table)
-            elements.append(Spacer(1, 20))
-            
-            # Notes
-            if receipt.notes:
-                elements.append(Paragraph("Notes", heading_style))
-                notes_style = ParagraphStyle('Notes', parent=styles['Normal'], fontSize=10)
-                elements.append(Paragraph(receipt.notes, notes_style))
-                elements.append(Spacer(1, 20))
-            
-            # Footer
-            footer_style = ParagraphStyle(
-                'Footer',
-                parent=styles['Normal'],
-                fontSize=9,
-                textColor=colors.grey,
-                alignment=TA_CENTER
-            )
-            elements.append(Spacer(1, 30))
-            elements.append(Paragraph("Thank you for your payment!", footer_style))
-            elements.append(Paragraph(f"Transaction ID: {receipt.transaction.transaction_id}", footer_style))
-            
-            # Build PDF
-            doc.build(elements)
-            
-            # Get PDF from buffer
-            pdf = buffer.getvalue()
-            buffer.close()
-        
+            pdf = build_receipt_pdf(receipt)
+
             # Create response
             response = HttpResponse(content_type='application/pdf')
             response['Content-Disposition'] = f'attachment; filename="receipt_{receipt.receipt_number}.pdf"'
             response['Access-Control-Expose-Headers'] = 'Content-Disposition'
             response.write(pdf)
-            
+
             logger.info(f"PDF generated successfully for receipt {receipt.receipt_number}")
             return response
-            
+
         except Exception as e:
             logger.error(f"Error generating PDF for receipt {pk}: {str(e)}", exc_info=True)
             return Response(
@@ -310,6 +216,66 @@ class ReceiptViewSet(BaseViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+    @action(detail=True, methods=['get'])
+    def download_status(self, request, pk=None):
+        """Poll a queued receipt PDF; returns the download_file URL once rendered"""
+        from celery.result import AsyncResult
+        from .pdf import receipt_pdf_name
+
+        receipt = self.get_object()
+        task_id = request.query_params.get('task_id')
+        if not task_id:
+            return Response(
+                {'error': 'task_id is required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        result = AsyncResult(task_id)
+        if not result.ready():
+            return Response({'status': 'pending'}, status=status.HTTP_202_ACCEPTED)
+        if result.failed():
+            logger.error(f"Error generating PDF for receipt {pk}: {result.result}")
+            return Response(
+                {'error': 'Failed to generate PDF'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+        # Only report on the file this receipt's task produced
+        if result.result != receipt_pdf_name(receipt):
+            return Response(
+                {'error': 'No PDF task found for this receipt'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        return Response({
+            'status': 'ready',
+            'url': self.reverse_action('download-file', args=[receipt.pk])
+        })
+
+    @action(detail=True, methods=['get'])
+    def download_file(self, request, pk=None):
+        """Stream a receipt PDF rendered by download's Celery task"""
+        from django.http import FileResponse
+        from .pdf import receipt_pdf_name, receipt_storage
+
+        # get_object() runs the same permission checks as download
+        receipt = self.get_object()
+        storage = receipt_storage()
+        name = receipt_pdf_name(receipt)
+        if not storage.exists(name):
+            return Response(
+                {'error': 'PDF not rendered yet; request download first'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        response = FileResponse(
+            storage.open(name, 'rb'),
+            as_attachment=True,
+            filename=f'receipt_{receipt.receipt_number}.pdf',
+            content_type='application/pdf'
+        )
+        response['Access-Control-Expose-Headers'] = 'Content-Disposition'
+        return response
+
 
 @extend_schema(tags=["Billing"])
 class BillingPeriodViewSet(BaseViewSet):
@@ -328,14 +294,9 @@ class BillingPeriodViewSet(BaseViewSet):
     @action(detail=False, methods=['get'])
     def current(self, request):
         """Get current active billing period"""
-        today = date.today()
         try:
-            # Get the most recent active billing period that covers today
-            current_period = BillingPeriod.objects.filter(
-                start_date__lte=today,
-                end_date__gte=today,
-                is_active=True
-            ).order_by('-start_date').first()
+            # Most recent active period covering today (cached per day)
+            current_period = BillingPeriod.get_current()
 
             if not current_period:
                 return Response(
@@ -356,29 +317,22 @@ class BillingPeriodViewSet(BaseViewSet):
         """Get billing period summary"""
         period = self.get_object()
 
-        utility_charges = UtilityCharge.objects.filter(billing_period=period)
-        invoices = Invoice.objects.filter(billing_period=period)
-        payments = RentPayment.objects.filter(billing_period=period)
-
-        total_charges = utility_charges.aggregate(
-            total=Sum('amount')
-        )['total'] or Decimal('0.00')
-
-        total_payments = payments.filter(
-            status='completed'
-        ).aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-
-        outstanding_balance = invoices.aggregate(
-            total=Sum('total_amount') - Sum('amount_paid')
-        )['total'] or Decimal('0.00')
+        # One aggregate per table, counts included
+        charges = UtilityCharge.objects.filter(billing_period=period).aggregate(
+            total=Sum('amount'), count=Count('id'))
+        invoices = Invoice.objects.filter(billing_period=period).aggregate(
+            outstanding=Sum('balance_due'), count=Count('id'))
+        total_payments = RentPayment.objects.filter(
+            billing_period=period, status='completed'
+        ).aggregate(total=Sum('amount'))['total']
 
         summary_data = {
             'period_name': period.name,
-            'total_charges': total_charges,
-            'total_payments': total_payments,
-            'outstanding_balance': outstanding_balance,
-            'utility_charges_count': utility_charges.count(),
-            'invoices_count': invoices.count()
+            'total_charges': charges['total'] or Decimal('0.00'),
+            'total_payments': total_payments or Decimal('0.00'),
+            'outstanding_balance': invoices['outstanding'] or Decimal('0.00'),
+            'utility_charges_count': charges['count'],
+            'invoices_count': invoices['count']
         }
 
         serializer = MonthlyBillingSummarySerializer(summary_data)
@@ -424,6 +378,11 @@ class BillingPeriodViewSet(BaseViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+    def _invoice_list_url(self, request, period):
+        """Paginated invoice listing for one billing period"""
+        return request.build_absolute_uri(
+            f"{reverse('invoice-list')}?billing_period={period.id}")
+
     @action(detail=True, methods=['post'])
     def generate_invoices(self, request, pk=None):
         """Generate invoices for all tenants in this billing period"""
@@ -445,41 +404,33 @@ class BillingPeriodViewSet(BaseViewSet):
         tenant_ids = serializer.validated_data.get('tenant_ids')
         auto_send = serializer.validated_data.get('auto_send', False)
 
-        # Get tenants
-        from tenant.models import Tenant
-        if tenant_ids:
-            tenants = Tenant.objects.filter(id__in=tenant_ids, is_active=True)
-        else:
-            tenants = Tenant.objects.filter(is_active=True)
-
-        invoices_created = []
-        errors = []
-
-        for tenant in tenants:
-            try:
-                invoice = Invoice.generate_for_tenant(
-                    tenant=tenant,
-                    billing_period=period,
-                    created_by=request.user
-                )
-
-                if auto_send and invoice.status == 'draft':
-                    invoice.status = 'sent'
-                    invoice.save()
+        # With a Celery broker, generate in a worker and answer right away
+        if not settings.CELERY_TASK_ALWAYS_EAGER:
+            from .tasks import generate_invoices
+            task = generate_invoices.delay(
+                period.id, tenant_ids, auto_send, request.user.pk)
+            return Response(
+                {'status': 'Invoice generation queued', 'task_id': task.id,
+                 'list_url': self._invoice_list_url(request, period)},
+                status=status.HTTP_202_ACCEPTED
+            )
 
-                invoices_created.append(invoice)
-            except Exception as e:
-                errors.append({
-                    'tenant_id': tenant.id,
-                    'tenant_name': tenant.user.get_full_name(),
-                    'error': str(e)
-                })
+        try:
+            invoices_created, errors = period.generate_invoices(
+                tenant_ids, auto_send, created_by=request.user)
+        except Exception as e:
+            # The run is one transaction; anything else rolls all of it back
+            logger.error(f"Invoice generation failed for period {period.id}: {e}",
+                         exc_info=True)
+            invoices_created = []
+            errors = [{'error': str(e)}]
 
+        # Counts only; the invoices themselves are a paginated listing away
         return Response({
             'status': 'Invoice generation completed',
             'invoices_created': len(invoices_created),
             'errors': errors,
-            'invoices': InvoiceListSerializer(invoices_created, many=True).data
+            'list_url': self._invoice_list_url(request, period)
         })
 
 
@@ -495,15 +446,18 @@ class ChargeTypeViewSet(BaseViewSet):
 @extend_schema(tags=["Invoices"])
 class InvoiceViewSet(BaseViewSet):
     queryset = Invoice.objects.select_related(
-        'tenant', 'billing_period').prefetch_related('items')
+        'tenant__user', 'billing_period').prefetch_related('items')
     filterset_fields = ['status', 'tenant', 'billing_period']
     search_fields = ['invoice_number',
                      'tenant__user__first_name', 'tenant__user__last_name']
-    ordering_fields = ['issue_date', 'due_date', 'total_amount']
-    ordering = ['-issue_date']
+    # Cursor pagination keys on the ordering column, so only near-unique ones
+    ordering_fields = ['id', 'created_at']
+    ordering = ['-id']
+    pagination_class = NewestFirstCursorPagination
 
     def get_serializer_class(self):
-        if self.action == 'list':
+        # overdue is a list too; this also gets it the narrow list SELECT
+        if self.action in ('list', 'overdue'):
             return InvoiceListSerializer
         elif self.action == 'retrieve':
             return InvoiceDetailSerializer
@@ -513,11 +467,7 @@ class InvoiceViewSet(BaseViewSet):
 
     def filter_for_property_manager(self, queryset, user):
         """Filter invoices for property manager's tenants"""
-        from tenant.models import Tenant
-        managed_tenant_ids = Tenant.objects.filter(
-            unit__property__manager=user
-        ).values_list('id', flat=True)
-        return queryset.filter(tenant_id__in=managed_tenant_ids)
+        return queryset.filter(tenant__unit__property__manager=user)
 
     def filter_for_tenant(self, queryset, user):
         """Filter invoices for specific tenant"""
@@ -528,7 +478,7 @@ class InvoiceViewSet(BaseViewSet):
             return queryset.none()
 
     def get_queryset(self):
-        queryset = super().get_queryset()
+        queryset = super().get_queryset().with_overdue()
 
         # Additional filters
         if self.request.query_params.get('overdue') == 'true':
@@ -552,16 +502,17 @@ class InvoiceViewSet(BaseViewSet):
         """Get unbilled utility charges for the invoice's tenant and billing period"""
         invoice = self.get_object()
 
-        unbilled_charges = UtilityCharge.objects.filter(
-            tenant=invoice.tenant,
-            billing_period=invoice.billing_period,
+        # Evaluated once; the count is the list's length
+        unbilled_charges = list(UtilityCharge.objects.filter(
+            tenant_id=invoice.tenant_id,
+            billing_period_id=invoice.billing_period_id,
             is_billed=False
-        )
+        ))
 
         serializer = UtilityChargeSerializer(unbilled_charges, many=True)
         return Response({
             'utility_charges': serializer.data,
-            'count': unbilled_charges.count()
+            'count': len(unbilled_charges)
         })
 
     @action(detail=True, methods=['post'])
@@ -587,44 +538,65 @@ class InvoiceViewSet(BaseViewSet):
         errors = []
 
         with db_transaction.atomic():
-            for charge_id in utility_charge_ids:
-                try:
-                    charge = UtilityCharge.objects.get(id=charge_id)
+            # One locked read for the whole batch instead of a get() per id
+            charges = {
+                str(charge.pk): charge
+                for charge in UtilityCharge.objects.select_for_update(
+                    of=('self',)).filter(id__in=utility_charge_ids)
+            }
+            # An invoice holds one item per charge type
+            taken_types = set(
+                invoice.items.values_list('charge_type__name', flat=True))
 
-                    # Verify charge belongs to same tenant and period
-                    if charge.tenant != invoice.tenant:
-                        errors.append({
-                            'charge_id': charge_id,
-                            'error': 'Charge does not belong to invoice tenant'
-                        })
-                        continue
+            for charge_id in utility_charge_ids:
+                charge = charges.get(str(charge_id))
+                if charge is None:
+                    errors.append({
+                        'charge_id': charge_id,
+                        'error': 'Utility charge not found'
+                    })
+                    continue
 
-                    if charge.billing_period != invoice.billing_period:
-                        errors.append({
-                            'charge_id': charge_id,
-                            'error': 'Charge does not belong to invoice billing period'
-                        })
-                        continue
+                # Verify charge belongs to same tenant and period
+                if charge.tenant_id != invoice.tenant_id:
+                    errors.append({
+                        'charge_id': charge_id,
+                        'error': 'Charge does not belong to invoice tenant'
+                    })
+                    continue
 
-                    if charge.is_billed:
-                        errors.append({
-                            'charge_id': charge_id,
-                            'error': 'Charge already billed'
-                        })
-                        continue
+                if charge.billing_period_id != invoice.billing_period_id:
+                    errors.append({
+                        'charge_id': charge_id,
+                        'error': 'Charge does not belong to invoice billing period'
+                    })
+                    continue
 
-                    # Add charge to invoice
-                    charge.add_to_invoice(invoice)
-                    added_charges.append(charge)
+                if charge.is_billed:
+                    errors.append({
+                        'charge_id': charge_id,
+                        'error': 'Charge already billed'
+                    })
+                    continue
 
-                except UtilityCharge.DoesNotExist:
+                type_name = f"{charge.utility_type} Bill"
+                if type_name in taken_types:
                     errors.append({
                         'charge_id': charge_id,
-                        'error': 'Utility charge not found'
+                        'error': f'Invoice already has a {type_name} item'
                     })
+                    continue
 
-            # Recalculate invoice totals
+                taken_types.add(type_name)
+                added_charges.append(charge)
+
+            # Insert the items and flag the charges billed in bulk
             if added_charges:
+                UtilityCharge.bulk_add_to_invoices(
+                    UtilityCharge.objects.filter(
+                        pk__in=[charge.pk for charge in added_charges]),
+                    {invoice.tenant_id: invoice}
+                )
                 invoice.recalculate_totals()
 
         return Response({
@@ -637,10 +609,7 @@ class InvoiceViewSet(BaseViewSet):
     @action(detail=True, methods=['post'])
     def send(self, request, pk=None):
         """Mark invoice as sent"""
-        invoice = self.get_object()
-        if invoice.status == 'draft':
-            invoice.status = 'sent'
-            invoice.save(update_fields=['status'])
+        if self._transition(pk, ['draft'], 'sent'):
             return Response({'status': 'Invoice sent'})
         return Response(
             {'error': 'Invoice must be in draft status'},
@@ -650,16 +619,27 @@ class InvoiceViewSet(BaseViewSet):
     @action(detail=True, methods=['post'])
     def cancel(self, request, pk=None):
         """Cancel invoice"""
-        invoice = self.get_object()
-        if invoice.status in ['draft', 'sent']:
-            invoice.status = 'cancelled'
-            invoice.save(update_fields=['status'])
+        if self._transition(pk, ['draft', 'sent'], 'cancelled'):
             return Response({'status': 'Invoice cancelled'})
         return Response(
             {'error': 'Cannot cancel paid or partially paid invoice'},
             status=status.HTTP_400_BAD_REQUEST
         )
 
+    def _transition(self, pk, from_statuses, to_status):
+        """Conditional status UPDATE; False if the invoice isn't in from_statuses.
+
+        get_queryset() carries the same role scoping as the object
+        permission check, so an invoice outside it is a 404 as before.
+        """
+        queryset = self.get_queryset().filter(pk=pk)
+        if queryset.filter(status__in=from_statuses).update(
+                status=to_status, updated_at=timezone.now()):
+            return True
+        if not queryset.exists():
+            raise Http404
+        return False
+
     @action(detail=False, methods=['get'])
     def overdue(self, request):
         """Get overdue invoices"""
@@ -674,8 +654,10 @@ class InvoiceViewSet(BaseViewSet):
                 page, many=True, context={'request': request})
             return self.get_paginated_response(serializer.data)
 
+        # Unpaginated: don't keep every model instance alive at once
         serializer = InvoiceListSerializer(
-            overdue_invoices, many=True, context={'request': request})
+            overdue_invoices.iterator(chunk_size=500), many=True,
+            context={'request': request})
         return Response(serializer.data)
 
     @action(detail=True, methods=['post'])
@@ -691,7 +673,14 @@ class InvoiceViewSet(BaseViewSet):
 
         serializer = InvoiceItemCreateSerializer(data=request.data)
         if serializer.is_valid():
-            item = serializer.save(invoice=invoice)
+            try:
+                with db_transaction.atomic():
+                    item = serializer.save(invoice=invoice)
+            except IntegrityError:
+                return Response(
+                    {'error': 'Invoice already has an item for this charge type'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
             invoice.recalculate_totals()
 
             return Response({
@@ -785,8 +774,10 @@ class InvoiceViewSet(BaseViewSet):
         """Get payment history for an invoice"""
         invoice = self.get_object()
 
-        payments = invoice.payments.all()
-        receipts = invoice.receipts.all()
+        # Same relations InvoiceDetailSerializer prefetches; each nested
+        # receipt renders its tenant's name
+        payments = invoice.payments.select_related('receipt__tenant__user')
+        receipts = invoice.receipts.select_related('tenant__user')
         transactions = invoice.transactions.all()
 
         return Response({
@@ -804,6 +795,21 @@ class InvoiceItemViewSet(BaseViewSet):
     ordering_fields = ['line_total', 'created_at']
     ordering = ['id']
 
+    def perform_create(self, serializer):
+        self._save_item(serializer)
+
+    def perform_update(self, serializer):
+        self._save_item(serializer)
+
+    def _save_item(self, serializer):
+        # A concurrent insert can still hit uniq_invoice_chargetype
+        try:
+            with db_transaction.atomic():
+                serializer.save()
+        except IntegrityError:
+            raise ValidationError(
+                {'charge_type': 'Invoice already has an item for this charge type'})
+
 
 @extend_schema(tags=["Transactions"])
 class TransactionViewSet(BaseViewSet):
@@ -821,13 +827,8 @@ class TransactionViewSet(BaseViewSet):
 
     def filter_for_property_manager(self, queryset, user):
         """Filter transactions for property manager's tenants"""
-        from tenant.models import Tenant
-        managed_tenants = Tenant.objects.filter(
-            unit__property__manager=user
-        )
-        account_ids = managed_tenants.values_list(
-            'user__account__id', flat=True)
-        return queryset.filter(account_id__in=account_ids)
+        return queryset.filter(
+            account__user__tenant_profile__unit__property__manager=user)
 
     def filter_for_tenant(self, queryset, user):
         """Filter transactions for specific tenant"""
@@ -987,6 +988,7 @@ class UtilityChargeViewSet(BaseViewSet):
 
             billed_count = 0
             errors = []
+            touched_invoice_ids = set()
 
             with db_transaction.atomic():
                 for charge in charges:
@@ -1004,7 +1006,7 @@ class UtilityChargeViewSet(BaseViewSet):
 
                         # Add charge to invoice
                         charge.add_to_invoice(invoice)
-                        invoice.recalculate_totals()
+                        touched_invoice_ids.add(invoice.pk)
                         billed_count += 1
 
                     except Exception as e:
@@ -1014,6 +1016,11 @@ class UtilityChargeViewSet(BaseViewSet):
                             'error': str(e)
                         })
 
+                # Totals once per invoice, in one UPDATE, not once per charge
+                if touched_invoice_ids:
+                    Invoice.objects.filter(
+                        pk__in=touched_invoice_ids).recalculate_totals()
+
             return Response({
                 'status': 'Bulk billing completed',
                 'charges_billed': billed_count,
@@ -1040,11 +1047,7 @@ class RentPaymentViewSet(BaseViewSet):
 
     def filter_for_property_manager(self, queryset, user):
         """Filter rent payments for property manager's tenants"""
-        from tenant.models import Tenant
-        managed_tenant_ids = Tenant.objects.filter(
-            unit__property__manager=user
-        ).values_list('id', flat=True)
-        return queryset.filter(tenant_id__in=managed_tenant_ids)
+        return queryset.filter(tenant__unit__property__manager=user)
 
     def filter_for_tenant(self, queryset, user):
         """Filter rent payments for specific tenant"""
@@ -1118,18 +1121,14 @@ class RentPaymentViewSet(BaseViewSet):
     @action(detail=False, methods=['get'])
     def overdue(self, request):
         """Get all overdue rent payments"""
-        qs = self.get_queryset().filter(
-            status='pending',
-            due_date__lt=date.today()
+        # get_queryset() already applies the role-based filtering
+        qs = RentPaymentListSerializer.setup_eager_loading(
+            self.get_queryset().filter(
+                status='pending',
+                due_date__lt=date.today()
+            )
         )
 
-        # Apply role-based filtering
-        user = request.user
-        if user.role == 'property_manager':
-            qs = self.filter_for_property_manager(qs, user)
-        elif user.role == 'tenant':
-            qs = self.filter_for_tenant(qs, user)
-
         page = self.paginate_queryset(qs)
         if page is not None:
             serializer = RentPaymentListSerializer(
@@ -1143,14 +1142,8 @@ class RentPaymentViewSet(BaseViewSet):
     @action(detail=False, methods=['get'])
     def pending(self, request):
         """Get pending rent payments"""
-        qs = self.get_queryset().filter(status='pending')
-
-        # Role-based filtering
-        user = request.user
-        if user.role == 'property_manager':
-            qs = self.filter_for_property_manager(qs, user)
-        elif user.role == 'tenant':
-            qs = self.filter_for_tenant(qs, user)
+        qs = RentPaymentListSerializer.setup_eager_loading(
+            self.get_queryset().filter(status='pending'))
 
         page = self.paginate_queryset(qs)
         if page is not None:
@@ -1187,11 +1180,7 @@ class PaymentViewSet(BaseViewSet):
 
     def filter_for_property_manager(self, queryset, user):
         """Filter payments for property manager's tenants"""
-        from tenant.models import Tenant
-        managed_tenant_ids = Tenant.objects.filter(
-            unit__property__manager=user
-        ).values_list('id', flat=True)
-        return queryset.filter(tenant_id__in=managed_tenant_ids)
+        return queryset.filter(tenant__unit__property__manager=user)
 
     def filter_for_tenant(self, queryset, user):
         """Filter payments for specific tenant"""
@@ -1328,12 +1317,10 @@ class PaymentViewSet(BaseViewSet):
                     notes=serializer.validated_data.get('notes', '')
                 )
 
+                # process() mirrors the invoice's new amount_paid/status on
+                # payment.invoice, which is this same object; no reload
                 receipt = payment.process(processed_by=request.user)
 
-                # Refresh invoice to get updated data
-                if invoice:
-                    invoice.refresh_from_db()
-
                 return Response({
                     'status': 'success',
                     'message': 'Payment processed successfully',
@@ -1354,6 +1341,11 @@ class PaymentViewSet(BaseViewSet):
             )
 
 
+def _month_start(year, month):
+    """Aware start of a month; a range on created_at can use its index"""
+    return timezone.make_aware(datetime(year, month, 1))
+
+
 @extend_schema(tags=["Dashboard"])
 class DashboardViewSet(viewsets.ViewSet):
     """Dashboard analytics endpoints with role-based filtering"""
@@ -1401,14 +1393,12 @@ class DashboardViewSet(viewsets.ViewSet):
 
         monthly_revenue = Transaction.objects.filter(
             transaction_type='payment',
-            created_at__month=current_month,
-            created_at__year=current_year
+            created_at__gte=_month_start(current_year, current_month)
         ).aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
 
         monthly_charges = Transaction.objects.filter(
             transaction_type='charge',
-            created_at__month=current_month,
-            created_at__year=current_year
+            created_at__gte=_month_start(current_year, current_month)
         ).aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
 
         # Account balances
@@ -1501,15 +1491,13 @@ class DashboardViewSet(viewsets.ViewSet):
         monthly_revenue = Transaction.objects.filter(
             account_id__in=account_ids,
             transaction_type='payment',
-            created_at__month=current_month,
-            created_at__year=current_year
+            created_at__gte=_month_start(current_year, current_month)
         ).aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
 
         monthly_charges = Transaction.objects.filter(
             account_id__in=account_ids,
             transaction_type='charge',
-            created_at__month=current_month,
-            created_at__year=current_year
+            created_at__gte=_month_start(current_year, current_month)
         ).aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
 
         # Account balances
@@ -1,3 +1,5 @@
+import re
+
 from django.db import models
 
 from django.db import models
@@ -6,6 +8,15 @@ from django.core.validators import RegexValidator
 from django.utils.translation import gettext_lazy as _
 from utils.common import EnumWithChoices
 
+# Compiled once at import instead of per field/form instance
+_CONTACT_NUMBER_VALIDATOR = RegexValidator(
+    regex=re.compile(r"^\+?\d{9,15}$"),
+    message=_(
+        "Phone number must be entered in the format: '+254...' or '07...'. "
+        "Up to 15 digits allowed."
+    ),
+)
+
 class Office(models.Model):
     name = models.CharField(
         max_length=100,
@@ -35,15 +46,7 @@ class Office(models.Model):
     )
     contact_number = models.CharField(
         max_length=15,
-        validators=[
-            RegexValidator(
-                regex=r"^\+?\d{9,15}$",
-                message=_(
-                    "Phone number must be entered in the format: '+254...' or '07...'. "
-                    "Up to 15 digits allowed."
-                ),
-            )
-        ],
+        validators=[_CONTACT_NUMBER_VALIDATOR],
         help_text=_("Official contact number"),
         blank=True,
         null=True,
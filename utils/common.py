@@ -1,4 +1,8 @@
 from enum import Enum
+from functools import cache
+import os
+import time
+import uuid
 
 from os import path
 
@@ -7,9 +11,25 @@ from os import path
 class EnumWithChoices(Enum):
 
     @classmethod
+    @cache
     def choices(cls):
-        return [(key.value, key.name) for key in cls]
+        return tuple((key.value, key.name) for key in cls)
     
 def generate_document_filepath(instance, filename: str) -> str:
     filename, extension = path.splitext(filename)
     return f"{instance.__class__.__name__.lower()}/{filename}_{instance.id or ''}{extension}"
+
+
+def uuid7() -> uuid.UUID:
+    """Time-ordered UUID (RFC 9562 version 7).
+
+    48-bit Unix millisecond timestamp followed by random bits, so new values
+    land at the right edge of a B-tree index instead of a random leaf.
+    """
+    value = (time.time_ns() // 1_000_000) << 80
+    value |= int.from_bytes(os.urandom(10), 'big')
+    value &= ~(0xF << 76)
+    value |= 0x7 << 76  # version
+    value &= ~(0x3 << 62)
+    value |= 0x2 << 62  # RFC 4122 variant
+    return uuid.UUID(int=value)
@@ -0,0 +1,19 @@
+import orjson
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+# orjson handles dict/list/str/int/float/datetime/UUID natively; everything
+# else (Decimal, lazy translations, querysets, ...) goes through DRF's encoder
+_fallback_encoder = JSONEncoder()
+
+
+class OrjsonRenderer(JSONRenderer):
+    """JSONRenderer that encodes with orjson; output matches DRF's encoder."""
+    options = orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return orjson.dumps(
+            data, default=_fallback_encoder.default, option=self.options)
@@ -0,0 +1,20 @@
+from contextvars import ContextVar
+from datetime import date
+
+
+# Set once per request by a_core.middleware.RequestDateMiddleware
+_TODAY = ContextVar('today', default=None)
+
+
+def today():
+    """date.today(), read once per request when called inside one."""
+    return _TODAY.get() or date.today()
+
+
+def set_today(value=None):
+    """Pin today() for the current context; returns a token for reset_today()."""
+    return _TODAY.set(value or date.today())
+
+
+def reset_today(token):
+    _TODAY.reset(token)